@@ -1,17 +1,28 @@
 import psycopg2
 import psycopg2.extras
-import requests
+import psycopg2.pool
+import aiohttp
+import asyncio
+import ijson
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import os
 from dotenv import load_dotenv
 import logging
 from logging.handlers import RotatingFileHandler
 import sys
 import time
+import random
 from config import DB_CONFIG
-import multiprocessing
 from utils import get_uname
+from rate_limiter import TokenBucket, parse_retry_after
+from change_cache import ChangeCache, parse_api_time
+from scheduler import PollScheduler
+from metrics import METRICS, start_metrics_server
+from leases import LeaseManager, LEASE_RENEW_INTERVAL, LEASE_TTL
+from spool import Spool, SPOOL_RETRY_INTERVAL
 
 load_dotenv()
 
@@ -26,36 +37,232 @@ logging.basicConfig(
 )
 logger = logging.getLogger('odds_collector')
 
-class DatabaseManager:
-    def __init__(self):
-        self.conn_params = DB_CONFIG
-        self.cache = {}
-        self.first_pass = True
-        self.changes_this_update = set()
+# Rows per multi-row INSERT statement when flushing a batch
+BATCH_PAGE_SIZE: int = int(os.getenv('BATCH_PAGE_SIZE', 1000))
+
+class OddsBatch:
+    """
+    Rows collected from one poll response and written in a single transaction.
+    Odds rows reference their period by (event_id, period_number) until the
+    period_id is known at flush time.
+    """
+    def __init__(self, sport_id: Optional[int] = None):
+        self.sport_id = sport_id
         self.since = None
+        # Set on the last batch of a poll, which also writes the request log
+        self.final = False
+        self.event_count = 0
+        # Monotonic time the poll's request was sent, set on the final batch
+        self.started = None
+        # Cursor the poll advanced to, checkpointed with the final batch
+        self.cursor = None
+        # Wall-clock time of the poll, set on the final batch to order checkpoints
+        self.recorded_at = None
+        # Set on batches replayed from the spool, so each is written only once
+        self.record_id = None
+        # Games with changed odds, for the per-poll update log
+        self.changes = set()
+        self.seen = set()
+        self.events = {}
+        self.periods = {}
+        # Periods whose id is cached and whose metadata did not change
+        self.period_ids = {}
+        self.money_lines = []
+        self.spreads = []
+        self.totals = []
+        self.team_totals = []
+        # (period ref, market) -> (poll time, spread or total lines on the board), when that set moved
+        self.open_lines = {}
+        # Change-detection keys updated while building this batch
+        self.cache_keys = []
+        # Statements the write needed, filled in by write_batch
+        self.round_trips = 0
+
+    def add_event(self, row: tuple):
+        # A multi-row upsert may not touch the same row twice, keep the latest
+        self.events[row[0]] = row
+
+    def add_period(self, row: tuple):
+        self.periods[(row[0], row[1])] = row
+
+    def row_count(self) -> int:
+        """Rows the batch writes across all tables, including last-seen records and the request log"""
+        return (
+            len(self.events) + len(self.seen) + len(self.periods) + len(self.money_lines)
+            + len(self.spreads) + len(self.totals) + len(self.team_totals) + int(self.final and self.event_count > 0)
+        )
+
+    def to_record(self) -> Dict[str, Any]:
+        """Plain JSON form of the batch for the spool"""
+        def odds(rows):
+            return [[row[0].isoformat(), list(row[1])] + list(row[2:]) for row in rows]
+        return {
+            'sport_id': self.sport_id,
+            'since': self.since,
+            'final': self.final,
+            'event_count': self.event_count,
+            'cursor': self.cursor,
+            'recorded_at': self.recorded_at.isoformat() if self.recorded_at else None,
+            'events': list(self.events.values()),
+            'seen': list(self.seen),
+            'periods': list(self.periods.values()),
+            'period_ids': [[event_id, number, period_id] for (event_id, number), period_id in self.period_ids.items()],
+            'money_lines': odds(self.money_lines),
+            'spreads': odds(self.spreads),
+            'totals': odds(self.totals),
+            'team_totals': odds(self.team_totals),
+            'open_lines': [
+                [event_id, number, market, checked_at.isoformat(), list(lines)]
+                for ((event_id, number), market), (checked_at, lines) in self.open_lines.items()
+            ]
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'OddsBatch':
+        def odds(rows):
+            return [(datetime.fromisoformat(row[0]), tuple(row[1])) + tuple(row[2:]) for row in rows]
+        batch = cls(record['sport_id'])
+        batch.record_id = record['record_id']
+        batch.since = record['since']
+        batch.final = record['final']
+        batch.event_count = record['event_count']
+        batch.cursor = record['cursor']
+        batch.recorded_at = datetime.fromisoformat(record['recorded_at']) if record['recorded_at'] else None
+        for row in record['events']:
+            batch.add_event(tuple(row))
+        batch.seen = set(record['seen'])
+        for row in record['periods']:
+            batch.add_period(tuple(row))
+        batch.period_ids = {(event_id, number): period_id for event_id, number, period_id in record['period_ids']}
+        batch.money_lines = odds(record['money_lines'])
+        batch.spreads = odds(record['spreads'])
+        batch.totals = odds(record['totals'])
+        batch.team_totals = odds(record['team_totals'])
+        batch.open_lines = {
+            ((event_id, number), market): (datetime.fromisoformat(checked_at), tuple(lines))
+            for event_id, number, market, checked_at, lines in record['open_lines']
+        }
+        return batch
+
+    def merge(self, other: 'OddsBatch'):
+        self.seen.update(other.seen)
+        self.changes.update(other.changes)
+        self.events.update(other.events)
+        self.periods.update(other.periods)
+        self.period_ids.update(other.period_ids)
+        self.money_lines.extend(other.money_lines)
+        self.spreads.extend(other.spreads)
+        self.totals.extend(other.totals)
+        self.team_totals.extend(other.team_totals)
+        self.open_lines.update(other.open_lines)
+        self.cache_keys.extend(other.cache_keys)
+
+# Checkpoints older than this many minutes are ignored and the sport starts from a full snapshot
+CHECKPOINT_MAX_AGE: int = int(os.getenv('CHECKPOINT_MAX_AGE', 60))
+# Idle connections older than this are pinged before being handed out
+DB_HEALTHCHECK_INTERVAL: float = float(os.getenv('DB_HEALTHCHECK_INTERVAL', 30))
+
+class DatabasePool:
+    """Connection pool shared by all sport collectors in the process"""
+    def __init__(self):
+        self.conn_params = {
+            **DB_CONFIG,
+            # Let the OS notice dead server connections held by the pool
+            'keepalives': 1,
+            'keepalives_idle': 30,
+            'keepalives_interval': 10,
+            'keepalives_count': 3
+        }
+        self.max_connections = int(os.getenv('DB_MAX_CONNECTIONS', 4))
+        self.pool = None
+        self.last_used = {}
+
+    def get_pool(self):
+        """Create the connection pool on first use"""
+        if self.pool is None or self.pool.closed:
+            self.pool = psycopg2.pool.ThreadedConnectionPool(
+                int(os.getenv('DB_MIN_CONNECTIONS', 1)),
+                self.max_connections,
+                **self.conn_params
+            )
+        return self.pool
+
+    def is_healthy(self, conn) -> bool:
+        """Check a pooled connection, pinging it only when it sat idle for a while"""
+        if conn.closed:
+            return False
+        if time.monotonic() - self.last_used.get(id(conn), 0) < DB_HEALTHCHECK_INTERVAL:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
 
     def get_connection(self):
-        """Create and return a database connection"""
-        return psycopg2.connect(**self.conn_params)
+        """Take a healthy connection from the pool, reconnecting if needed"""
+        pool = self.get_pool()
+        conn = pool.getconn()
+        if not self.is_healthy(conn):
+            logger.warning("Discarding broken database connection, reconnecting")
+            self.last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        return conn
+
+    def release_connection(self, conn, broken: bool = False):
+        """Return a connection to the pool, closing it if it is no longer usable"""
+        if broken or conn.closed:
+            self.last_used.pop(id(conn), None)
+            self.get_pool().putconn(conn, close=True)
+        else:
+            self.last_used[id(conn)] = time.monotonic()
+            self.get_pool().putconn(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for the duration of a with-block"""
+        conn = self.get_connection()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release_connection(conn, broken)
+
+    def close(self):
+        if self.pool is not None and not self.pool.closed:
+            self.pool.closeall()
+
+def as_float(value) -> Optional[float]:
+    """Prices and limits compare as floats, whether decoded from a JSON integer or a stored DECIMAL"""
+    return None if value is None else float(value)
 
-    def has_changed(self, table: str, key: tuple, new_value: Dict) -> bool:
+class DatabaseManager:
+    def __init__(self, pool: DatabasePool, cache: ChangeCache):
+        self.pool = pool
+        self.cache = cache
+        self.first_pass = True
+        # Dimension rows this worker already wrote: (sport_id, team uname) -> team_id,
+        # and league_id -> (name, uname)
+        self.team_ids: Dict[tuple, int] = {}
+        self.league_names: Dict[int, tuple] = {}
+
+    def has_changed(self, event_id: int, key: tuple, new_value: tuple) -> bool:
         """
         Check if the value has changed from the cached version
         """
-        cache_key = (table,) + key
-        if cache_key not in self.cache:
-            self.cache[cache_key] = new_value
-            return True
-        
-        if self.cache[cache_key] != new_value:
-            self.cache[cache_key] = new_value
-            return True
-            
-        return False
+        return self.cache.has_changed(event_id, key, new_value)
 
-    def clear_changes(self):
-        """Clear the changes set at the start of each update"""
-        self.changes_this_update.clear()
+    def forget(self, cache_keys: list):
+        """Drop cached values whose rows failed to write so they are retried next poll"""
+        for event_id, key in cache_keys:
+            self.cache.forget(event_id, key)
 
     def verify_data_counts(self, conn):
         """Verify the counts of data in each table"""
@@ -80,189 +287,141 @@ class DatabaseManager:
         finally:
             cur.close()
 
-    def insert_log(self, conn, event_id: int, since: str):
-        cur = conn.cursor()
-        try:
-            # Execute the INSERT query
-            cur.execute('''
-                INSERT INTO api_request_logs (
-                    event_id, since, created_at
-                ) VALUES (%s, %s, DEFAULT)
-            ''', (event_id, since))
+    def insert_rows(self, cur, batch: OddsBatch, table: str, sql: str, rows: list, **kwargs):
+        """Multi-row insert into one table, timed and counted for the metrics endpoint"""
+        with METRICS.timer('odds_write_seconds', sport_id=batch.sport_id, table=table):
+            result = psycopg2.extras.execute_values(cur, sql, rows, page_size=BATCH_PAGE_SIZE, **kwargs)
+        batch.round_trips += -(-len(rows) // BATCH_PAGE_SIZE)
+        METRICS.inc('odds_rows_written_total', len(rows), sport_id=batch.sport_id, table=table)
+        return result
 
-            
-            # Commit the transaction
-            conn.commit()
-            # print("Request log inserted successfully.")
-        except psycopg2.Error as e:
-            # Rollback in case of an error
-            conn.rollback()
-            print(f"An error occurred: {e}")
-
-    def insert_since(self, since: str):
-        self.since = since
+    def write_dimensions(self, cur, batch: OddsBatch):
+        """
+        Upsert the leagues and teams of the batch's events that this worker has not
+        written yet. Returns the league rows and the ids of the new teams, which
+        join the memo only once the transaction commits.
+        """
+        leagues = {}
+        teams = {}
+        for row in batch.events.values():
+            sport_id, league_id = row[1], row[3]
+            if league_id is not None and self.league_names.get(league_id) != (row[4], row[5]):
+                leagues[league_id] = (league_id, sport_id, row[4], row[5])
+            for name, uname in ((row[7], row[8]), (row[9], row[10])):
+                if (sport_id, uname) not in self.team_ids:
+                    teams[(sport_id, uname)] = (sport_id, name, uname)
 
-    def get_since(self):
-        return self.since
-            
-class OddsCollector:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
-        self.last_timestamp = None
+        if leagues:
+            self.insert_rows(cur, batch, 'leagues', '''
+                INSERT INTO leagues (league_id, sport_id, name, uname) VALUES %s
+                ON CONFLICT (league_id) DO UPDATE SET
+                    name = EXCLUDED.name,
+                    uname = EXCLUDED.uname
+                WHERE (leagues.name, leagues.uname) IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.uname)
+            ''', list(leagues.values()))
 
-    def get_pinnacle_odds(self, sport_id: str) -> Optional[Dict]:
+        new_team_ids = {}
+        if teams:
+            rows = self.insert_rows(cur, batch, 'teams', '''
+                INSERT INTO teams (sport_id, name, uname) VALUES %s
+                ON CONFLICT (sport_id, uname) DO UPDATE SET name = EXCLUDED.name
+                RETURNING sport_id, uname, team_id
+            ''', list(teams.values()), fetch=True)
+            new_team_ids = {(row[0], row[1]): row[2] for row in rows}
+        return leagues, new_team_ids
 
-        """Fetch odds data from Pinnacle API"""
-        url = os.getenv('PINNACLE_API_MARKETS_URL')
-        
-        headers = {
-            "x-rapidapi-host": os.getenv('PINNACLE_API_HOST'),
-            "x-rapidapi-key": os.getenv('PINNACLE_API_KEY')
-        }
-        
-        params = {
-            "sport_id": sport_id,
-            "is_have_odds": "true"
-        }
-        
-        if self.last_timestamp:
-            params["since"] = str(self.last_timestamp)
-        
-        logger.info(f"Making API request to Pinnacle{' with sport_id=' + str(sport_id) + ' since=' + str(self.last_timestamp) if self.last_timestamp else ''}")
+    def write_batch(self, conn, batch: OddsBatch) -> Dict[tuple, int]:
+        """
+        Write all rows of a poll batch with multi-row inserts in one transaction.
+        Returns the period_id of every period that was upserted.
+        """
+        cur = conn.cursor()
         try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            if 'since' in params:
-                self.db_manager.insert_since(params['since'])
+            # A spooled batch is written once, however often its replay is retried
+            if batch.record_id is not None:
+                cur.execute('''
+                    INSERT INTO spool_replays (record_id) VALUES (%s)
+                    ON CONFLICT (record_id) DO NOTHING
+                    RETURNING record_id
+                ''', (batch.record_id,))
+                batch.round_trips += 1
+                if cur.fetchone() is None:
+                    conn.rollback()
+                    logger.info(f"Spooled batch {batch.record_id} was already written, skipping it")
+                    return {}
 
-            if 'last' in data:
-                self.last_timestamp = data['last']
-                # logger.info('set last_timestamp:' + str(self.last_timestamp))
-            
-            return data
-        
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API request failed: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response content: {e.response.text}")
-            return None
-
-    def store_event(self, conn, event: Dict[str, Any], sport_name: str, cur=None) -> None:
-        """Store event and its related data in the database"""
-        if cur is None:
-            cur = conn.cursor()
-        
-        self.db_manager.insert_log(conn, event['event_id'], self.db_manager.get_since())
+            # One log row per poll that returned events; per-event freshness lives in event_last_seen
+            if batch.final and batch.event_count:
+                cur.execute('''
+                    INSERT INTO api_request_logs (sport_id, since, event_count) VALUES (%s, %s, %s)
+                ''', (batch.sport_id, batch.since, batch.event_count))
+                batch.round_trips += 1
 
-        try:
-            # Determine event category
-            event_category = 'standard'
-            if event.get('resulting_unit') in ['Corners', 'Bookings']:
-                event_category = event['resulting_unit'].lower()
-                
-            data_changed = False
-            changed_items = {
-                'money_line': False,
-                'spreads': set(),
-                'totals': set(),
-                'team_totals': set()
-            }
-            
-            # Track changes for all event types
-            for period_key, period in event['periods'].items():
-                # Money line tracking
-                if period.get('money_line'):
-                    money_line_data = {
-                        'home_odds': period['money_line'].get('home'),
-                        'draw_odds': period['money_line'].get('draw'),
-                        'away_odds': period['money_line'].get('away')
-                    }
-                    if self.db_manager.has_changed('money_lines', (event['event_id'], period_key), money_line_data):
-                        data_changed = True
-                        changed_items['money_line'] = True
-
-                # # Spreads tracking
-                # if period.get('spreads'):
-                #     for handicap_key, spread in period['spreads'].items():
-                #         handicap = float(spread.get('hdp', handicap_key))  # Support both hdp and direct handicap
-                #         spread_data = {
-                #             'home_odds': spread.get('home'),
-                #             'away_odds': spread.get('away'),
-                #             'max_bet': spread.get('max')
-                #         }
-                #         if self.db_manager.has_changed('spreads', (event['event_id'], period_key, handicap), spread_data):
-                #             data_changed = True
-                #             changed_items['spreads'].add(handicap)
-
-                # # Totals tracking
-                # if period.get('totals'):
-                #     for points, total in period['totals'].items():
-                #         total_data = {
-                #             'over_odds': total.get('over'),
-                #             'under_odds': total.get('under'),
-                #             'max_bet': total.get('max')
-                #         }
-                #         if self.db_manager.has_changed('totals', (event['event_id'], period_key, float(points)), total_data):
-                #             data_changed = True
-                #             changed_items['totals'].add(float(points))
-
-                # # Team totals tracking
-                # if period.get('team_total'):
-                #     for team_type, team_data in period['team_total'].items():
-                #         if team_data:
-                #             team_total_data = {
-                #                 'points': team_data.get('points'),
-                #                 'over_odds': team_data.get('over'),
-                #                 'under_odds': team_data.get('under')
-                #             }
-                #             if self.db_manager.has_changed('team_totals', (event['event_id'], period_key, team_type), team_total_data):
-                #                 data_changed = True
-                #                 changed_items['team_totals'].add(team_type)
-
-            # Log changes if detected
-            if data_changed and not self.db_manager.first_pass:
-                self.db_manager.changes_this_update.add(f"{event['home']} vs {event['away']}")
-                
-                changes_desc = []
-                if changed_items['money_line']:
-                    changes_desc.append("Moneyline")
-                # if changed_items['spreads']:
-                #     changes_desc.append(f"Spreads (handicaps: {sorted(changed_items['spreads'])})")
-                # if changed_items['totals']:
-                #     changes_desc.append(f"Totals (points: {sorted(changed_items['totals'])})")
-                # if changed_items['team_totals']:
-                #     changes_desc.append(f"Team Totals ({', '.join(changed_items['team_totals'])})")
-                logger.info(f"Changes detected for {event['home']} vs {event['away']}: {', '.join(changes_desc)}")
-
-            # Insert or update event
-            cur.execute('''
-            INSERT INTO events (
-                event_id, sport_id, sport_uname, league_id, league_name, league_uname, starts, home_team, home_team_uname,
-                away_team, away_team_uname, event_type, parent_id, resulting_unit, is_have_odds, event_category
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (event_id) DO UPDATE SET
-                last_updated = CURRENT_TIMESTAMP,
-                home_team = EXCLUDED.home_team,
-                away_team = EXCLUDED.away_team
-            ''', (
-                event['event_id'], event['sport_id'], get_uname(sport_name), event['league_id'],
-                event['league_name'], get_uname(event['league_name']), event['starts'], event['home'],
-                get_uname(event['home']), event['away'], get_uname(event['away']), event['event_type'],
-                event['parent_id'], event['resulting_unit'], event['is_have_odds'], event_category
-            ))
-            
-            # Process periods
-            for period_key, period in event['periods'].items():
-                period_number = int(period_key.replace('num_', ''))
-                
+            # Saved in the same transaction as the rows, so the cursor never runs ahead of the data;
+            # a replayed batch never moves a newer checkpoint back
+            if batch.final and batch.cursor is not None:
                 cur.execute('''
+                    INSERT INTO collector_checkpoints (sport_id, last, updated_at)
+                    VALUES (%s, %s, COALESCE(%s, CURRENT_TIMESTAMP))
+                    ON CONFLICT (sport_id) DO UPDATE SET
+                        last = EXCLUDED.last,
+                        updated_at = EXCLUDED.updated_at
+                    WHERE collector_checkpoints.updated_at <= EXCLUDED.updated_at
+                ''', (batch.sport_id, str(batch.cursor), batch.recorded_at))
+                batch.round_trips += 1
+
+            leagues, new_team_ids = {}, {}
+            if batch.events:
+                leagues, new_team_ids = self.write_dimensions(cur, batch)
+                team_ids = {**self.team_ids, **new_team_ids}
+                self.insert_rows(cur, batch, 'events', '''
+                INSERT INTO events (
+                    event_id, sport_id, sport_uname, league_id, league_name, league_uname, starts, home_team, home_team_uname,
+                    away_team, away_team_uname, event_type, parent_id, resulting_unit, is_have_odds, event_category,
+                    home_team_id, away_team_id
+                ) VALUES %s
+                ON CONFLICT (event_id) DO UPDATE SET
+                    last_updated = CURRENT_TIMESTAMP,
+                    league_name = EXCLUDED.league_name,
+                    league_uname = EXCLUDED.league_uname,
+                    starts = EXCLUDED.starts,
+                    home_team = EXCLUDED.home_team,
+                    home_team_uname = EXCLUDED.home_team_uname,
+                    away_team = EXCLUDED.away_team,
+                    away_team_uname = EXCLUDED.away_team_uname,
+                    is_have_odds = EXCLUDED.is_have_odds,
+                    home_team_id = EXCLUDED.home_team_id,
+                    away_team_id = EXCLUDED.away_team_id
+                -- Leave identical rows alone so no update trigger fires for them
+                WHERE (
+                    events.league_name, events.starts, events.home_team, events.away_team, events.is_have_odds,
+                    events.home_team_id, events.away_team_id
+                ) IS DISTINCT FROM (
+                    EXCLUDED.league_name, EXCLUDED.starts, EXCLUDED.home_team, EXCLUDED.away_team, EXCLUDED.is_have_odds,
+                    EXCLUDED.home_team_id, EXCLUDED.away_team_id
+                )
+                ''', [
+                    row + (team_ids.get((row[1], row[8])), team_ids.get((row[1], row[10])))
+                    for row in batch.events.values()
+                ])
+
+            if batch.seen:
+                self.insert_rows(cur, batch, 'event_last_seen', '''
+                    INSERT INTO event_last_seen (event_id, since, seen_at) VALUES %s
+                    ON CONFLICT (event_id) DO UPDATE SET
+                        since = EXCLUDED.since,
+                        seen_at = EXCLUDED.seen_at
+                ''', [(event_id, batch.since) for event_id in batch.seen],
+                template='(%s, %s, CURRENT_TIMESTAMP)')
+
+            upserted = {}
+            if batch.periods:
+                rows = self.insert_rows(cur, batch, 'periods', '''
                     INSERT INTO periods (
                         event_id, period_number, period_status, cutoff,
                         max_spread, max_money_line, max_total, max_team_total,
                         line_id, number
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ) VALUES %s
                     ON CONFLICT (event_id, period_number)
                     DO UPDATE SET 
                         period_status = EXCLUDED.period_status,
@@ -273,196 +432,957 @@ class OddsCollector:
                         max_team_total = EXCLUDED.max_team_total,
                         line_id = EXCLUDED.line_id,
                         number = EXCLUDED.number
-                    RETURNING period_id
-                ''', (
-                    event['event_id'],
-                    period_number,
-                    period['period_status'],
-                    period['cutoff'],
-                    period['meta'].get('max_spread'),
-                    period['meta'].get('max_money_line'),
-                    period['meta'].get('max_total'),
-                    period['meta'].get('max_team_total'),
-                    period.get('line_id'),
-                    period.get('number')
-                ))
-                
-                period_id = cur.fetchone()[0]
-                current_time = datetime.now()
+                    RETURNING event_id, period_number, period_id
+                ''', list(batch.periods.values()), fetch=True)
+                upserted = {(row[0], row[1]): row[2] for row in rows}
+            period_ids = {**batch.period_ids, **upserted}
 
-                # Only insert new rows for changed odds
-                if changed_items['money_line'] and period.get('money_line'):
-                    cur.execute('''
-                    INSERT INTO money_lines (
-                        time, period_id, home_odds, draw_odds, away_odds, max_bet
-                    ) VALUES (%s, %s, %s, %s, %s, %s)
-                    ''', (
-                        current_time,
-                        period_id,
-                        period['money_line'].get('home'),
-                        period['money_line'].get('draw'),
-                        period['money_line'].get('away'),
-                        period['meta'].get('max_money_line')
-                    ))
-
-                if period.get('spreads'):
-                    for handicap_key, spread in period['spreads'].items():
-                        handicap = float(spread.get('hdp', handicap_key))
-                        # if handicap in changed_items['spreads']:
-                        if spread:
-                            cur.execute('''
-                            INSERT INTO spreads (
-                                time, period_id, handicap, alt_line_id,
-                                home_odds, away_odds, max_bet
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            ''', (
-                                current_time,
-                                period_id,
-                                handicap,
-                                spread.get('alt_line_id'),
-                                spread.get('home'),
-                                spread.get('away'),
-                                spread.get('max')
-                            ))
-
-                if period.get('totals'):
-                    for points, total in period['totals'].items():
-                        # if float(points) in changed_items['totals']:
-                        if total:
-                            cur.execute('''
-                            INSERT INTO totals (
-                                time, period_id, points, alt_line_id,
-                                over_odds, under_odds, max_bet
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            ''', (
-                                current_time,
-                                period_id,
-                                float(points),
-                                total.get('alt_line_id'),
-                                total.get('over'),
-                                total.get('under'),
-                                total.get('max')
-                            ))
-
-                if period.get('team_total'):
-                    for team_type, team_data in period['team_total'].items():
-                        # if team_data and team_type in changed_items['team_totals']:
-                        if team_data:
-                            cur.execute('''
-                            INSERT INTO team_totals (
-                                time, period_id, team_type, points,
-                                over_odds, under_odds, max_bet
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            ''', (
-                                current_time,
-                                period_id,
-                                team_type,
-                                team_data.get('points'),
-                                team_data.get('over'),
-                                team_data.get('under'),
-                                period['meta'].get('max_team_total')
-                            ))
+            odds_tables = [
+                ('money_lines', '(time, period_id, home_odds, draw_odds, away_odds, max_bet)', batch.money_lines),
+                ('spreads', '(time, period_id, handicap, alt_line_id, home_odds, away_odds, max_bet)', batch.spreads),
+                ('totals', '(time, period_id, points, alt_line_id, over_odds, under_odds, max_bet)', batch.totals),
+                ('team_totals', '(time, period_id, team_type, points, over_odds, under_odds, max_bet)', batch.team_totals)
+            ]
+
+            for table, columns, rows in odds_tables:
+                if rows:
+                    self.insert_rows(
+                        cur, batch, table,
+                        f"INSERT INTO {table} {columns} VALUES %s",
+                        [(row[0], period_ids[row[1]]) + row[2:] for row in rows]
+                    )
+
+            self.write_current_lines(cur, batch, period_ids)
 
             conn.commit()
-            
-        except Exception as e:
+            batch.round_trips += 1
+            self.team_ids.update(new_team_ids)
+            self.league_names.update({league_id: row[2:] for league_id, row in leagues.items()})
+            return upserted
+        except Exception:
             conn.rollback()
-            logger.error(f"Error storing event {event['event_id']}: {str(e)}")
             raise
+        finally:
+            cur.close()
 
-def get_sports_ids():
-    url = os.getenv('PINNACLE_API_SPORTS_URL')
-        
+    def write_current_lines(self, cur, batch: OddsBatch, period_ids: Dict[tuple, int]):
+        """
+        Upsert the latest price of every changed line into current_lines, and mark the
+        spread and total lines that dropped off the board closed. The line key is built
+        in SQL, so it matches the history backfill of the current_lines migration. Rows
+        a newer poll already wrote are left alone, so a late spool replay, possibly of a
+        sport another node has taken over since, never moves the board back.
+        """
+        # One row per line, the last one wins if a line moved twice in the batch
+        latest = {}
+        for time_, ref, home, draw, away, max_bet in batch.money_lines:
+            latest[(ref, 'money_lines', None)] = (period_ids[ref], 'money_lines', None, None, None, home, draw, away, None, None, max_bet, time_)
+        for time_, ref, handicap, alt_line_id, home, away, max_bet in batch.spreads:
+            latest[(ref, 'spreads', handicap)] = (period_ids[ref], 'spreads', handicap, None, alt_line_id, home, None, away, None, None, max_bet, time_)
+        for time_, ref, points, alt_line_id, over, under, max_bet in batch.totals:
+            latest[(ref, 'totals', points)] = (period_ids[ref], 'totals', points, None, alt_line_id, None, None, None, over, under, max_bet, time_)
+        for time_, ref, team_type, points, over, under, max_bet in batch.team_totals:
+            latest[(ref, 'team_totals', team_type)] = (period_ids[ref], 'team_totals', points, team_type, None, None, None, None, over, under, max_bet, time_)
+
+        if latest:
+            self.insert_rows(cur, batch, 'current_lines', '''
+                INSERT INTO current_lines (
+                    period_id, market, line, points, team_type, alt_line_id,
+                    home_odds, draw_odds, away_odds, over_odds, under_odds, max_bet, time, updated_at
+                )
+                SELECT
+                    v.period_id, v.market, COALESCE(v.team_type, v.points::float8::text, ''), v.points, v.team_type, v.alt_line_id,
+                    v.home_odds, v.draw_odds, v.away_odds, v.over_odds, v.under_odds, v.max_bet, v.time, v.time
+                FROM (VALUES %s) AS v (
+                    period_id, market, points, team_type, alt_line_id,
+                    home_odds, draw_odds, away_odds, over_odds, under_odds, max_bet, time
+                )
+                ON CONFLICT (period_id, market, line) DO UPDATE SET
+                    points = EXCLUDED.points,
+                    alt_line_id = EXCLUDED.alt_line_id,
+                    home_odds = EXCLUDED.home_odds,
+                    draw_odds = EXCLUDED.draw_odds,
+                    away_odds = EXCLUDED.away_odds,
+                    over_odds = EXCLUDED.over_odds,
+                    under_odds = EXCLUDED.under_odds,
+                    max_bet = EXCLUDED.max_bet,
+                    time = EXCLUDED.time,
+                    updated_at = EXCLUDED.updated_at,
+                    is_open = TRUE
+                WHERE current_lines.updated_at <= EXCLUDED.updated_at
+            ''', list(latest.values()),
+            template='(%s::BIGINT, %s, %s::DECIMAL, %s, %s::BIGINT, %s::DECIMAL, %s::DECIMAL, %s::DECIMAL, %s::DECIMAL, %s::DECIMAL, %s::DECIMAL, %s::TIMESTAMPTZ)')
+
+        # Only periods whose set of lines moved are sent; a line absent from its set is closed
+        if batch.open_lines:
+            scope_periods, scope_markets, scope_times = [], [], []
+            open_periods, open_markets, open_points = [], [], []
+            for (ref, market), (checked_at, lines) in batch.open_lines.items():
+                scope_periods.append(period_ids[ref])
+                scope_markets.append(market)
+                scope_times.append(checked_at)
+                for points in lines:
+                    open_periods.append(period_ids[ref])
+                    open_markets.append(market)
+                    open_points.append(points)
+
+            with METRICS.timer('odds_write_seconds', sport_id=batch.sport_id, table='current_lines'):
+                cur.execute('''
+                    WITH scope AS (
+                        SELECT * FROM unnest(%s::BIGINT[], %s::TEXT[], %s::TIMESTAMPTZ[]) AS s (period_id, market, checked_at)
+                    ), open AS (
+                        SELECT period_id, market, points::text AS line
+                        FROM unnest(%s::BIGINT[], %s::TEXT[], %s::FLOAT8[]) AS o (period_id, market, points)
+                    ), state AS (
+                        SELECT c.period_id, c.market, c.line, s.checked_at,
+                            EXISTS (
+                                SELECT 1 FROM open o
+                                WHERE o.period_id = c.period_id AND o.market = c.market AND o.line = c.line
+                            ) AS is_open
+                        FROM current_lines c
+                        JOIN scope s ON s.period_id = c.period_id AND s.market = c.market
+                        WHERE c.updated_at <= s.checked_at
+                    )
+                    UPDATE current_lines c SET
+                        is_open = state.is_open,
+                        updated_at = state.checked_at
+                    FROM state
+                    WHERE c.period_id = state.period_id AND c.market = state.market AND c.line = state.line
+                    AND c.is_open IS DISTINCT FROM state.is_open
+                ''', (scope_periods, scope_markets, scope_times, open_periods, open_markets, open_points))
+            batch.round_trips += 1
+
+    def load_checkpoints(self) -> Dict[int, str]:
+        """Return the saved cursor of every sport checkpointed within CHECKPOINT_MAX_AGE"""
+        try:
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute('''
+                        SELECT sport_id, last FROM collector_checkpoints
+                        WHERE updated_at > CURRENT_TIMESTAMP - make_interval(mins => %s)
+                    ''', (CHECKPOINT_MAX_AGE,))
+                    return {sport_id: last for sport_id, last in cur.fetchall()}
+                finally:
+                    conn.rollback()
+                    cur.close()
+        except Exception as e:
+            logger.error(f"Could not load collector checkpoints, starting from full snapshots: {e}")
+            return {}
+
+    def load_latest_lines(self, sport_ids: Optional[list] = None) -> list:
+        """
+        Latest stored price of every market line of the active events, limited to
+        sport_ids when given, e.g. for sports taken over from another node. Runs in
+        a worker thread; warm_cache seeds the rows on the event loop.
+        """
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute('''
+                    WITH active AS (
+                        SELECT p.period_id, p.event_id, p.period_number, GREATEST(e.starts, p.cutoff) AS expires_at
+                        FROM periods p
+                        JOIN events e ON e.event_id = p.event_id
+                        WHERE e.archived_at = FALSE
+                        AND (%(sport_ids)s::INTEGER[] IS NULL OR e.sport_id = ANY(%(sport_ids)s::INTEGER[]))
+                    )
+                    (SELECT DISTINCT ON (m.period_id)
+                        'money_lines', a.event_id, a.period_number, NULL::DECIMAL, NULL::TEXT,
+                        m.home_odds, m.draw_odds, m.away_odds, m.max_bet, a.expires_at
+                    FROM money_lines m JOIN active a ON a.period_id = m.period_id
+                    ORDER BY m.period_id, m.time DESC)
+                    UNION ALL
+                    (SELECT DISTINCT ON (s.period_id, s.handicap)
+                        'spreads', a.event_id, a.period_number, s.handicap, NULL,
+                        s.home_odds, s.away_odds, s.max_bet, NULL, a.expires_at
+                    FROM spreads s JOIN active a ON a.period_id = s.period_id
+                    ORDER BY s.period_id, s.handicap, s.time DESC)
+                    UNION ALL
+                    (SELECT DISTINCT ON (t.period_id, t.points)
+                        'totals', a.event_id, a.period_number, t.points, NULL,
+                        t.over_odds, t.under_odds, t.max_bet, NULL, a.expires_at
+                    FROM totals t JOIN active a ON a.period_id = t.period_id
+                    ORDER BY t.period_id, t.points, t.time DESC)
+                    UNION ALL
+                    (SELECT DISTINCT ON (tt.period_id, tt.team_type)
+                        'team_totals', a.event_id, a.period_number, NULL, tt.team_type,
+                        tt.points, tt.over_odds, tt.under_odds, tt.max_bet, a.expires_at
+                    FROM team_totals tt JOIN active a ON a.period_id = tt.period_id
+                    ORDER BY tt.period_id, tt.team_type, tt.time DESC)
+                ''', {'sport_ids': sport_ids})
+                return cur.fetchall()
+            finally:
+                cur.close()
+                conn.rollback()
+
+    def warm_cache(self, rows: list) -> int:
+        """
+        Seed the change cache with rows from load_latest_lines, using the same keys and
+        value tuples store_event builds, so a restart writes nothing for markets that
+        did not move. The cache is shared by every sport's collector without a lock,
+        so this runs on the event loop.
+        """
+        expires = {}
+        for market, event_id, period_number, line, side, v1, v2, v3, v4, expires_at in rows:
+            period_key = f'num_{period_number}'
+            if market == 'money_lines':
+                key = (market, period_key)
+                value = (as_float(v1), as_float(v2), as_float(v3), as_float(v4))
+            elif market == 'team_totals':
+                key = (market, period_key, side)
+                value = (as_float(v1), as_float(v2), as_float(v3), as_float(v4))
+            else:
+                key = (market, period_key, float(line))
+                value = (as_float(v1), as_float(v2), as_float(v3))
+            self.cache.seed(event_id, key, value)
+            if expires_at is not None and (event_id not in expires or expires[event_id] < expires_at):
+                expires[event_id] = expires_at
+
+        for event_id, expires_at in expires.items():
+            self.cache.touch(event_id, expires_at)
+        self.cache.evict_oldest()
+        return len(rows)
+
+    def store_batch(self, batch: OddsBatch) -> Dict[tuple, int]:
+        """Write a batch on a pooled connection; runs in a worker thread"""
+        with self.pool.connection() as conn:
+            return self.write_batch(conn, batch)
+
+# HTTP client tuning for the RapidAPI host
+API_MAX_RETRIES: int = int(os.getenv('API_MAX_RETRIES', 3))
+API_RETRY_DELAY: float = float(os.getenv('API_RETRY_DELAY', 1))
+HTTP_TIMEOUT: float = float(os.getenv('HTTP_TIMEOUT', 60))
+HTTP_CONNECT_TIMEOUT: float = float(os.getenv('HTTP_CONNECT_TIMEOUT', 10))
+HTTP_READ_TIMEOUT: float = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+
+# Streamed /markets bodies are read only as fast as the decode and write stages keep up,
+# so they get no overall deadline; aiohttp stops the read timer while the queue holds the body back
+STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+
+def create_http_session() -> aiohttp.ClientSession:
+    """
+    Shared keep-alive session for all Pinnacle requests. aiohttp asks for
+    gzip/deflate, and br as well when the Brotli package is installed, and
+    decompresses responses transparently.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=int(os.getenv('MAX_CONCURRENT_REQUESTS', 10)),
+        keepalive_timeout=60,
+        ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=HTTP_TIMEOUT,
+        connect=HTTP_CONNECT_TIMEOUT,
+        sock_read=HTTP_READ_TIMEOUT
+    )
     headers = {
         "x-rapidapi-host": os.getenv('PINNACLE_API_HOST'),
         "x-rapidapi-key": os.getenv('PINNACLE_API_KEY')
     }
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers)
 
-    # logger.info("Requesting sports list information from Pinnacle API")
+@asynccontextmanager
+async def open_response(session: aiohttp.ClientSession, limiter: TokenBucket, url: str, params: Optional[Dict] = None, timeout: Optional[aiohttp.ClientTimeout] = None):
+    """
+    Open a GET response from a Pinnacle endpoint, retrying connection errors,
+    timeouts, 429 and 5xx with exponential backoff. Yields None when the
+    request did not succeed.
+    """
+    for attempt in range(API_MAX_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(API_RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+        try:
+            await limiter.acquire()
+            response = await session.get(url, params=params, timeout=timeout or session.timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"API request failed: {e!r} (attempt {attempt + 1})")
+            continue
+
+        if response.status == 429:
+            response.release()
+            limiter.backoff(parse_retry_after(response.headers.get('Retry-After')))
+            continue
+        if response.status >= 500:
+            response.release()
+            logger.warning(f"API request failed: {response.status} {response.reason} (attempt {attempt + 1})")
+            continue
+        if response.status >= 400:
+            logger.error(f"API request failed: {response.status} {response.reason}")
+            logger.error(f"Response content: {await response.text()}")
+            response.release()
+            yield None
+            return
+
+        limiter.succeeded()
+        try:
+            yield response
+        finally:
+            response.release()
+        return
 
+    logger.error(f"API request to {url} failed after {API_MAX_RETRIES + 1} attempts")
+    yield None
+
+async def fetch_json(session: aiohttp.ClientSession, limiter: TokenBucket, url: str, params: Optional[Dict] = None) -> Optional[Any]:
+    """GET a Pinnacle endpoint and decode the whole JSON body"""
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
+        async with open_response(session, limiter, url, params) as response:
+            if response is None:
+                return None
+            return await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        logger.error(f"API request failed: {e!r}")
+        return None
+
+# Bytes handed to the incremental JSON decoder at a time
+STREAM_CHUNK_SIZE: int = 64 * 1024
+
+class MarketsStream:
+    """
+    Incremental decoder for a /markets response. A single pass of ijson's C
+    backend tokenizes the body chunk by chunk; each event is assembled as soon
+    as it is complete, and the top-level fields the collector needs are picked
+    out of the same token stream.
+    """
+    FIELDS = ('sport_name', 'last')
+
+    def __init__(self):
+        self.tokens = ijson.sendable_list()
+        self.parser = ijson.parse_coro(self.tokens, use_float=True)
+        self.builder: Optional[ijson.ObjectBuilder] = None
+        self.events = []
+        self.fields: Dict[str, Any] = {}
+
+    def consume(self) -> list:
+        for prefix, event, value in self.tokens:
+            if self.builder is not None:
+                self.builder.event(event, value)
+                if prefix == 'events.item' and event in ('end_map', 'end_array'):
+                    self.events.append(self.builder.value)
+                    self.builder = None
+            elif prefix == 'events.item':
+                if event in ('start_map', 'start_array'):
+                    self.builder = ijson.ObjectBuilder()
+                    self.builder.event(event, value)
+                else:
+                    self.events.append(value)
+            elif prefix in self.FIELDS:
+                self.fields[prefix] = value
+        del self.tokens[:]
+        events = self.events
+        self.events = []
+        return events
+
+    def feed(self, chunk: bytes) -> list:
+        """Decode the next chunk of the body and return the events it completed"""
+        self.parser.send(chunk)
+        return self.consume()
+
+    def close(self) -> list:
+        """Finish decoding; raises if the body was truncated"""
+        self.parser.close()
+        return self.consume()
+
+    def field(self, name: str) -> Optional[Any]:
+        return self.fields.get(name)
+
+# Events per write while a large response is still streaming in
+INGEST_FLUSH_EVENTS: int = int(os.getenv('INGEST_FLUSH_EVENTS', 500))
+# Depth of the queues between the fetch, decode and write stages
+INGEST_QUEUE_SIZE: int = int(os.getenv('INGEST_QUEUE_SIZE', 8))
+
+class Poll:
+    """One request to the markets endpoint as it moves through the collector stages"""
+    def __init__(self, since: Optional[str]):
+        self.since = since
+        self.started = time.monotonic()
+        # Set by the fetcher once the whole body was received
+        self.complete = False
+        # Set by the decoder once the body was parsed and the cursor advanced
+        self.decoded = asyncio.Event()
+        self.broken = False
+        self.event_count = 0
+        # Events with at least one changed row, feeding the scheduler's change rate
+        self.changed = 0
+        # Seconds spent parsing the body and comparing events against the change cache
+        self.decode_seconds = 0.0
+        self.detect_seconds = 0.0
+        self.stream: Optional[MarketsStream] = None
+        self.batch: Optional[OddsBatch] = None
+        self.pending = []
+
+class OddsCollector:
+    def __init__(self, pool: DatabasePool, limiter: TokenBucket, cache: ChangeCache, scheduler: PollScheduler, spool: Optional[Spool] = None):
+        self.db_manager = DatabaseManager(pool, cache)
+        self.limiter = limiter
+        self.scheduler = scheduler
+        # Takes batches while the database is unreachable
+        self.spool = spool
+        self.last_timestamp = None
+        # Write totals of the poll whose batches are being flushed
+        self.write_seconds = 0.0
+        self.written_rows = 0
+        self.round_trips = 0
+
+    def resume(self, since: Optional[str]):
+        """Continue incremental polling from a checkpointed cursor instead of a full snapshot"""
+        if since is None:
+            return
+        self.last_timestamp = since
+        self.db_manager.first_pass = False
+
+    async def fetch_stage(self, session: aiohttp.ClientSession, sport_id: int, chunks: asyncio.Queue):
+        """Fetcher: stream each poll's response body into the decoder queue"""
+        url = os.getenv('PINNACLE_API_MARKETS_URL')
+
+        while True:
+            try:
+                # Quiet sports wait longer so busy ones get more of the request budget
+                await self.scheduler.wait(sport_id)
+                poll = Poll(self.last_timestamp)
+
+                params = {
+                    "sport_id": str(sport_id),
+                    "is_have_odds": "true"
+                }
+                
+                if poll.since:
+                    params["since"] = str(poll.since)
+                
+                logger.info(f"Making API request to Pinnacle{' with sport_id=' + str(sport_id) + ' since=' + str(poll.since) if poll.since else ''}")
+                async with open_response(session, self.limiter, url, params, STREAM_TIMEOUT) as response:
+                    if response is None:
+                        METRICS.inc('odds_fetch_errors_total', sport_id=sport_id)
+                        await asyncio.sleep(1)
+                        continue
+
+                    # Rate limiter wait up to the response headers
+                    responded = time.monotonic()
+                    METRICS.observe('odds_stage_seconds', responded - poll.started, sport_id=sport_id, stage='request')
+                    try:
+                        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                            await chunks.put((poll, chunk))
+                        poll.complete = True
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        METRICS.inc('odds_fetch_errors_total', sport_id=sport_id)
+                        logger.error(f"API response for sport {sport_id} broke off: {e!r}")
+                    # Includes time blocked on a full decoder queue
+                    METRICS.observe('odds_stage_seconds', time.monotonic() - responded, sport_id=sport_id, stage='download')
+
+                    await chunks.put((poll, None))
+
+                # The next request needs this poll's cursor, but not its database write
+                await poll.decoded.wait()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Fetch failed for sport {sport_id}: {e}")
+                await asyncio.sleep(1)
+
+    async def decode_stage(self, sport_id: int, chunks: asyncio.Queue, batches: asyncio.Queue):
+        """Decoder: parse response chunks into events and build write batches from them"""
+        while True:
+            poll, chunk = await chunks.get()
+            if poll.stream is None:
+                poll.stream = MarketsStream()
+                poll.batch = OddsBatch(sport_id)
+
+            try:
+                if chunk is not None:
+                    if not poll.broken:
+                        started = time.monotonic()
+                        events = poll.stream.feed(chunk)
+                        poll.decode_seconds += time.monotonic() - started
+                        await self.decode_events(poll, events, batches)
+                    continue
+
+                if poll.complete and not poll.broken:
+                    started = time.monotonic()
+                    events = poll.stream.close()
+                    poll.decode_seconds += time.monotonic() - started
+                    await self.decode_events(poll, events, batches)
+                    # Only advance the cursor once the whole response was read
+                    if poll.stream.field('last') is not None:
+                        self.last_timestamp = poll.stream.field('last')
+                        # logger.info('set last_timestamp:' + str(self.last_timestamp))
+                    self.scheduler.observe(sport_id, poll.changed, first_pass=poll.since is None)
+                    METRICS.observe('odds_stage_seconds', poll.decode_seconds, sport_id=sport_id, stage='decode')
+                    METRICS.observe('odds_stage_seconds', poll.detect_seconds, sport_id=sport_id, stage='change_detection')
+                else:
+                    # The response broke off midway; retry whatever was not written yet
+                    self.db_manager.forget(poll.batch.cache_keys)
+                    poll.batch = OddsBatch(sport_id)
+
+                if poll.event_count:
+                    METRICS.inc('odds_polls_total', sport_id=sport_id)
+                    METRICS.inc('odds_poll_events_total', poll.event_count, sport_id=sport_id)
+                    METRICS.inc('odds_changed_events_total', poll.changed, sport_id=sport_id)
+                # A poll without events still sends a final batch, which only refreshes the
+                # checkpoint, so a quiet sport's cursor does not age out of load_checkpoints
+                if poll.event_count or (poll.complete and not poll.broken):
+                    poll.batch.final = True
+                    poll.batch.event_count = poll.event_count
+                    poll.batch.since = poll.since
+                    poll.batch.started = poll.started
+                    poll.batch.cursor = self.last_timestamp
+                    poll.batch.recorded_at = datetime.now(timezone.utc)
+                    await batches.put(poll.batch)
+                poll.decoded.set()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Decoding failed for sport {sport_id}: {e}")
+                poll.broken = True
+                if chunk is None:
+                    self.db_manager.forget(poll.batch.cache_keys)
+                    poll.decoded.set()
+
+    async def decode_events(self, poll: 'Poll', events: list, batches: asyncio.Queue):
+        """Add decoded events to the poll's batch, handing it to the writer once it is large enough"""
+        # Events decoded before sport_name arrives wait for it
+        poll.pending.extend(events)
+        sport_name = poll.stream.field('sport_name')
+        if sport_name is None:
+            return
+
+        for event in poll.pending:
+            poll.event_count += 1
+            # Build each event separately so a malformed one leaves no partial rows
+            event_batch = OddsBatch(poll.batch.sport_id)
+            started = time.monotonic()
+            try:
+                self.store_event(event_batch, event, sport_name)
+            except Exception as e:
+                self.db_manager.forget(event_batch.cache_keys)
+                logger.error(f"Error processing event: {e}")
+                continue
+            finally:
+                poll.detect_seconds += time.monotonic() - started
+            if event_batch.changes:
+                poll.changed += 1
+            poll.batch.merge(event_batch)
+
+            # Write the initial snapshot progressively instead of after the last byte
+            if len(poll.batch.seen) >= INGEST_FLUSH_EVENTS:
+                poll.batch.since = poll.since
+                await batches.put(poll.batch)
+                poll.batch = OddsBatch(poll.batch.sport_id)
+        poll.pending.clear()
+
+    async def write_stage(self, sport_id: int, batches: asyncio.Queue):
+        """Writer: store batches in order while the next poll is fetched and decoded"""
+        while True:
+            batch = await batches.get()
+            if not await self.flush(batch):
+                continue
+
+            if batch.final and self.db_manager.first_pass:
+                logger.info(f"Initial data load complete for sport {sport_id}")
+                self.db_manager.first_pass = False
+            elif batch.changes:
+                logger.info("Updates detected for:")
+                for game in sorted(batch.changes):
+                    logger.info(f"  • {game}")
+
+            self.db_manager.cache.prune()
+
+    def spool_batch(self, batch: OddsBatch) -> bool:
+        """Keep a batch on disk for replay; its cache keys stay, the rows will land"""
+        try:
+            self.spool.append(batch.to_record())
+        except (OSError, TypeError, ValueError) as e:
+            self.db_manager.forget(batch.cache_keys)
+            logger.error(f"Could not spool batch for sport {batch.sport_id}: {e}")
+            return False
+        METRICS.inc('odds_spooled_batches_total', sport_id=batch.sport_id)
+        return True
+
+    async def flush(self, batch: OddsBatch) -> bool:
+        """Write a batch off the event loop; on failure its changes are retried next poll"""
+        # Queue behind batches already spooled so each sport's writes stay in order
+        if self.spool is not None and self.spool.active:
+            return self.spool_batch(batch)
+
+        started = time.monotonic()
+        try:
+            # psycopg2 blocks, so the write runs in a worker thread
+            upserted = await asyncio.to_thread(self.db_manager.store_batch, batch)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            if self.spool is None:
+                self.db_manager.forget(batch.cache_keys)
+                METRICS.inc('odds_write_failures_total', sport_id=batch.sport_id)
+                logger.error(f"Process failed: {e}")
+                return False
+            logger.error(f"Database unavailable, spooling batch for sport {batch.sport_id}: {e}")
+            return self.spool_batch(batch)
+        except Exception as e:
+            self.db_manager.forget(batch.cache_keys)
+            METRICS.inc('odds_write_failures_total', sport_id=batch.sport_id)
+            logger.error(f"Process failed: {e}")
+            return False
+        finally:
+            self.write_seconds += time.monotonic() - started
+            METRICS.inc('odds_db_round_trips_total', batch.round_trips, sport_id=batch.sport_id)
+
+        self.written_rows += batch.row_count()
+        self.round_trips += batch.round_trips
+        if batch.final:
+            METRICS.observe('odds_stage_seconds', self.write_seconds, sport_id=batch.sport_id, stage='write')
+            METRICS.observe('odds_poll_rows', self.written_rows, sport_id=batch.sport_id)
+            METRICS.observe('odds_poll_db_round_trips', self.round_trips, sport_id=batch.sport_id)
+            self.write_seconds = 0.0
+            self.written_rows = 0
+            self.round_trips = 0
+
+        # Later polls reuse these ids and skip the upsert while the metadata holds
+        for (event_id, period_number), period_id in upserted.items():
+            period_meta = batch.periods[(event_id, period_number)][2:]
+            self.db_manager.cache.remember_period(event_id, period_number, period_meta, period_id)
+        return True
+
+    def store_event(self, batch: OddsBatch, event: Dict[str, Any], sport_name: str) -> None:
+        """Add event and its related data to the batch, keeping only odds that changed"""
+        batch.seen.add(event['event_id'])
+
+        # Determine event category
+        event_category = 'standard'
+        if event.get('resulting_unit') in ['Corners', 'Bookings']:
+            event_category = event['resulting_unit'].lower()
+            
+        changed_items = {
+            'money_line': False,
+            'spreads': set(),
+            'totals': set(),
+            'team_totals': set()
+        }
+
+        # Insert or update the event only when its attributes differ from the last write;
+        # event_last_seen records that it was still listed
+        event_row = (
+            event['event_id'], event['sport_id'], get_uname(sport_name), event['league_id'],
+            event['league_name'], get_uname(event['league_name']), event['starts'], event['home'],
+            get_uname(event['home']), event['away'], get_uname(event['away']), event['event_type'],
+            event['parent_id'], event['resulting_unit'], event['is_have_odds'], event_category
+        )
+        if self.db_manager.has_changed(event['event_id'], ('events',), event_row):
+            batch.cache_keys.append((event['event_id'], ('events',)))
+            batch.add_event(event_row)
         
-        ids = [sport['id'] for sport in data]
-        return ids
+        # Keep the event's cached odds until its start and every period cutoff have passed
+        starts = parse_api_time(event['starts'])
+        cutoffs = [parse_api_time(p.get('cutoff')) for p in event['periods'].values()]
+        expires_at = max(filter(None, [starts] + cutoffs), default=None)
+        self.db_manager.cache.touch(event['event_id'], expires_at)
+        self.scheduler.track_event(batch.sport_id, event['event_id'], starts, cutoffs)
+
+        current_time = datetime.now()
+
+        # Process periods
+        for period_key, period in event['periods'].items():
+            period_number = int(period_key.replace('num_', ''))
+            period_ref = (event['event_id'], period_number)
+            
+            period_meta = (
+                period['period_status'],
+                period['cutoff'],
+                period['meta'].get('max_spread'),
+                period['meta'].get('max_money_line'),
+                period['meta'].get('max_total'),
+                period['meta'].get('max_team_total'),
+                period.get('line_id'),
+                period.get('number')
+            )
+            # Only upsert periods that are new to this worker or whose metadata moved
+            period_id = self.db_manager.cache.period_id(event['event_id'], period_number, period_meta)
+            if period_id is None:
+                batch.add_period(period_ref + period_meta)
+            else:
+                batch.period_ids[period_ref] = period_id
+
+            # Money line tracking
+            if period.get('money_line'):
+                money_line_data = (
+                    as_float(period['money_line'].get('home')),
+                    as_float(period['money_line'].get('draw')),
+                    as_float(period['money_line'].get('away')),
+                    as_float(period['meta'].get('max_money_line'))
+                )
+                cache_key = ('money_lines', period_key)
+                if self.db_manager.has_changed(event['event_id'], cache_key, money_line_data):
+                    changed_items['money_line'] = True
+                    batch.cache_keys.append((event['event_id'], cache_key))
+                    batch.money_lines.append((current_time, period_ref) + money_line_data)
+
+            # Spreads tracking
+            board = {'spreads': set(), 'totals': set()}
+            if period.get('spreads'):
+                for handicap_key, spread in period['spreads'].items():
+                    if not spread:
+                        continue
+                    handicap = float(spread.get('hdp', handicap_key))  # Support both hdp and direct handicap
+                    board['spreads'].add(handicap)
+                    spread_data = (as_float(spread.get('home')), as_float(spread.get('away')), as_float(spread.get('max')))
+                    cache_key = ('spreads', period_key, handicap)
+                    if self.db_manager.has_changed(event['event_id'], cache_key, spread_data):
+                        changed_items['spreads'].add(handicap)
+                        batch.cache_keys.append((event['event_id'], cache_key))
+                        batch.spreads.append((current_time, period_ref, handicap, spread.get('alt_line_id')) + spread_data)
+
+            # Totals tracking
+            if period.get('totals'):
+                for points, total in period['totals'].items():
+                    if not total:
+                        continue
+                    total_data = (as_float(total.get('over')), as_float(total.get('under')), as_float(total.get('max')))
+                    board['totals'].add(float(points))
+                    cache_key = ('totals', period_key, float(points))
+                    if self.db_manager.has_changed(event['event_id'], cache_key, total_data):
+                        changed_items['totals'].add(float(points))
+                        batch.cache_keys.append((event['event_id'], cache_key))
+                        batch.totals.append((current_time, period_ref, float(points), total.get('alt_line_id')) + total_data)
+
+            # Team totals tracking
+            if period.get('team_total'):
+                for team_type, team_data in period['team_total'].items():
+                    if not team_data:
+                        continue
+                    team_total_data = (
+                        as_float(team_data.get('points')),
+                        as_float(team_data.get('over')),
+                        as_float(team_data.get('under')),
+                        as_float(period['meta'].get('max_team_total'))
+                    )
+                    cache_key = ('team_totals', period_key, team_type)
+                    if self.db_manager.has_changed(event['event_id'], cache_key, team_total_data):
+                        changed_items['team_totals'].add(team_type)
+                        batch.cache_keys.append((event['event_id'], cache_key))
+                        batch.team_totals.append((current_time, period_ref, team_type) + team_total_data)
+
+            # Lines that drop off the board are closed in current_lines, sent only when the set moves
+            for market, lines in board.items():
+                cache_key = ('board', market, period_key)
+                lines = tuple(sorted(lines))
+                if self.db_manager.has_changed(event['event_id'], cache_key, lines):
+                    batch.cache_keys.append((event['event_id'], cache_key))
+                    batch.open_lines[(period_ref, market)] = (current_time, lines)
+
+        data_changed = changed_items['money_line'] or any(
+            changed_items[market] for market in ('spreads', 'totals', 'team_totals')
+        )
+
+        # Log changes if detected
+        if data_changed and not self.db_manager.first_pass:
+            batch.changes.add(f"{event['home']} vs {event['away']}")
+            
+            changes_desc = []
+            if changed_items['money_line']:
+                changes_desc.append("Moneyline")
+            if changed_items['spreads']:
+                changes_desc.append(f"Spreads (handicaps: {sorted(changed_items['spreads'])})")
+            if changed_items['totals']:
+                changes_desc.append(f"Totals (points: {sorted(changed_items['totals'])})")
+            if changed_items['team_totals']:
+                changes_desc.append(f"Team Totals ({', '.join(sorted(changed_items['team_totals']))})")
+            logger.info(f"Changes detected for {event['home']} vs {event['away']}: {', '.join(changes_desc)}")
+
+async def get_sports_ids(session: aiohttp.ClientSession, limiter: TokenBucket):
+    url = os.getenv('PINNACLE_API_SPORTS_URL')
+
+    # logger.info("Requesting sports list information from Pinnacle API")
+
+    data = await fetch_json(session, limiter, url)
+    if data is None:
+        return None
         
-    except requests.exceptions.RequestException as e:
-            logger.error(f"API request failed: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response content: {e.response.text}")
-            return None
+    ids = [sport['id'] for sport in data]
+    return ids
     
-DELAY: float = 1 / float(os.getenv('RATE_LIMIT'))
+async def store_sport_info(session: aiohttp.ClientSession, pool: DatabasePool, limiter: TokenBucket, cache: ChangeCache, scheduler: PollScheduler, sport_id: int, since: Optional[str] = None, spool: Optional[Spool] = None):
+    """Run the fetch, decode and write stages for one sport, joined by bounded queues"""
+    collector = OddsCollector(pool, limiter, cache, scheduler, spool)
+    collector.resume(since)
+    chunks = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE * 8)
+    batches = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
 
-def store_sport_info(sport_id):
-    collector = OddsCollector()
+    # A stage that fails cancels the other two, so a restarted collector never
+    # polls alongside the stages of the one it replaced
+    async with asyncio.TaskGroup() as stages:
+        stages.create_task(collector.fetch_stage(session, sport_id, chunks))
+        stages.create_task(collector.decode_stage(sport_id, chunks, batches))
+        stages.create_task(collector.write_stage(sport_id, batches))
 
+async def drain_spool(spool: Spool, db_manager: DatabaseManager):
+    """Replay spooled batches in order once the database is reachable again"""
     while True:
+        item = spool.next_record() if spool.active else None
+        if item is None:
+            await asyncio.sleep(1)
+            continue
+
+        offset, record = item
         try:
-            collector.db_manager.clear_changes()
-            data = collector.get_pinnacle_odds(sport_id)
-            
-            if not data or not data.get('events'):
-                # logger.info("No new data received from API")
-                time.sleep(1)
-                continue
-            
-            conn = collector.db_manager.get_connection()
-            cur = conn.cursor()
-            
-            try:
-                for event in data['events']:
-                    try:
-                        collector.store_event(conn, event, data['sport_name'], cur)
-                    except Exception as e:
-                        logger.error(f"Error processing event: {e}")
-                        continue
+            batch = OddsBatch.from_record(record)
+            await asyncio.to_thread(db_manager.store_batch, batch)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            await asyncio.sleep(SPOOL_RETRY_INTERVAL)
+            continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # A record the database rejects would otherwise block every later one. Its rows
+            # never land, so its events start over in the change cache and are written afresh.
+            logger.error(f"Dropping spooled batch {record.get('record_id')}: {e}")
+            for event_id in record.get('seen', []):
+                db_manager.cache.evict(event_id)
+        else:
+            METRICS.inc('odds_replayed_batches_total', sport_id=batch.sport_id)
+
+        spool.done(offset)
+        if not spool.active:
+            logger.info("Spool replayed, writing to the database directly again")
+
+async def run_leased_sports(session: aiohttp.ClientSession, pool: DatabasePool, limiter: TokenBucket, cache: ChangeCache, scheduler: PollScheduler, sport_ids: list, rate: float, spool: Optional[Spool] = None):
+    """
+    Poll the sports this node holds a lease for, starting and stopping sport
+    collectors as leases are claimed, handed back or lost, and giving this node
+    its share of RATE_LIMIT.
+    """
+    leases = LeaseManager(pool, sport_ids)
+    db_manager = DatabaseManager(pool, cache)
+    tasks: Dict[int, asyncio.Task] = {}
+    renewed_at = None
 
-                if collector.db_manager.first_pass:
-                    logger.info("Initial data load complete")
-                    # collector.db_manager.verify_data_counts(conn)
-                    collector.db_manager.first_pass = False
-                elif collector.db_manager.changes_this_update:
-                    logger.info("Updates detected for:")
-                    for game in sorted(collector.db_manager.changes_this_update):
-                        logger.info(f"  • {game}")
+    def evict_sport(sport_id: int):
+        for event_id in scheduler.sport(sport_id).events:
+            cache.evict(event_id)
+
+    async def stop(sport_id: int):
+        task = tasks.pop(sport_id)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # Another node writes this sport meanwhile, so its cached fingerprints go stale
+        evict_sport(sport_id)
+        scheduler.remove(sport_id)
+
+    async def start(new_sports: set):
+        checkpoints = await asyncio.to_thread(db_manager.load_checkpoints)
+        try:
+            rows = await asyncio.to_thread(db_manager.load_latest_lines, sorted(new_sports))
+            loaded = db_manager.warm_cache(rows)
+            logger.info(f"Warmed change cache with {loaded} stored lines for sports {sorted(new_sports)}")
+        except Exception as e:
+            logger.error(f"Could not warm change cache, every line counts as changed on the first poll: {e}")
+        for sport_id in new_sports:
+            since = checkpoints.get(sport_id)
+            tasks[sport_id] = asyncio.create_task(
+                store_sport_info(session, pool, limiter, cache, scheduler, sport_id, since, spool)
+            )
+            logger.info(f"Started collecting sport {sport_id}{' from cursor ' + str(since) if since else ''}")
+
+    try:
+        while True:
+            attempt = time.monotonic()
+            try:
+                owned, release, live_nodes = await asyncio.to_thread(leases.balance)
+                renewed_at = attempt
             except Exception as e:
-                logger.error(f"Process failed: {e}")
+                logger.error(f"Lease renewal failed: {e}")
+                # Past the TTL another node may already hold these sports
+                if tasks and (renewed_at is None or time.monotonic() - renewed_at > LEASE_TTL - LEASE_RENEW_INTERVAL):
+                    logger.warning("Leases may have expired, pausing collection until they are renewed")
+                    for sport_id in list(tasks):
+                        await stop(sport_id)
+                await asyncio.sleep(LEASE_RENEW_INTERVAL)
+                continue
 
-            finally:
-                cur.close()
-                conn.close()
-            
+            limiter.set_rate(rate / live_nodes)
+            scheduler.set_rate(rate / live_nodes)
+
+            for sport_id, task in list(tasks.items()):
+                if task.done() and not task.cancelled():
+                    logger.error(f"Collector for sport {sport_id} stopped: {task.exception()!r}")
+                    tasks.pop(sport_id)
+                    # Batches it decoded but never wrote are cached as stored; the restart warms from the database
+                    evict_sport(sport_id)
+                elif sport_id not in owned:
+                    await stop(sport_id)
+                    logger.info(f"Stopped collecting sport {sport_id}, lease {'handed back' if sport_id in release else 'lost'}")
+
+            if release:
+                await asyncio.to_thread(leases.release, release)
+
+            new_sports = owned - set(tasks)
+            if new_sports:
+                await start(new_sports)
+
+            await asyncio.sleep(LEASE_RENEW_INTERVAL)
+    finally:
+        for sport_id in list(tasks):
+            await stop(sport_id)
+        try:
+            leases.leave()
         except Exception as e:
-            logger.error(f"Process failed for sport {sport_id}: {e}")
-        
-        time.sleep(DELAY)
+            logger.error(f"Could not hand back leases on shutdown: {e}")
 
-semaphore = multiprocessing.Semaphore(int(os.getenv('MAX_CONCURRENT_REQUESTS')))
+def export_state_metrics(metrics, cache: ChangeCache, scheduler: PollScheduler):
+    """Copy change cache and scheduler state into the metrics at scrape time"""
+    stats = cache.stats()
+    metrics.set('odds_change_cache_entries', stats['size'])
+    metrics.set('odds_change_cache_events', stats['events'])
+    metrics.set('odds_change_cache_hits_total', stats['hits'])
+    metrics.set('odds_change_cache_misses_total', stats['misses'])
+    metrics.set('odds_change_cache_evictions_total', stats['evictions'])
+    for sport_id, schedule in scheduler.stats().items():
+        metrics.set('odds_poll_interval_seconds', schedule['interval'], sport_id=sport_id)
 
-def process_sport_id(collector, sport_id):
-    with semaphore:
-        store_sport_info(collector, sport_id)
+async def run_collectors():
+    pool = DatabasePool()
+    # One request budget for all sports, RATE_LIMIT requests per second on average
+    rate = float(os.getenv('RATE_LIMIT'))
+    limiter = TokenBucket(rate, int(os.getenv('RATE_BURST', 1)))
+    # Splits that budget between sports by how fast their markets move
+    scheduler = PollScheduler(rate)
+    # Change-detection state for every sport, bounded by CACHE_MAX_ENTRIES
+    cache = ChangeCache()
+    METRICS.register(lambda metrics: export_state_metrics(metrics, cache, scheduler))
+    loop = asyncio.get_running_loop()
+    # One thread per pooled connection so database writes never wait on the pool
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=pool.max_connections))
 
+    async with create_http_session() as session:
+        sport_ids = await get_sports_ids(session, limiter)
 
-def main():
-    logger.info("Starting odds collection process")
-    sport_ids = get_sports_ids()
+        if not sport_ids:
+            logger.error("Failed to get sport IDs")
+            return
 
-    if not sport_ids:
-        logger.error("Failed to get sport IDs")
-        return
+        logger.info(f"Starting collection for {len(sport_ids)} sports, shared with the other collector nodes...")
+        metrics_runner = await start_metrics_server()
 
-    logger.info(f"Starting collection for {len(sport_ids)} sports...")
+        # Batches that could not be written survive restarts here and are replayed first
+        spool = Spool()
+        replay = asyncio.create_task(drain_spool(spool, DatabaseManager(pool, cache)))
 
-    with multiprocessing.Pool(processes=min(9, len(sport_ids))) as pool:
-        pool.map(store_sport_info, sport_ids)
+        try:
+            await run_leased_sports(session, pool, limiter, cache, scheduler, sport_ids, rate, spool)
+        finally:
+            replay.cancel()
+            spool.close()
+            pool.close()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+
+def main():
+    logger.info("Starting odds collection process")
+    asyncio.run(run_collectors())
     
 if __name__ == "__main__":
     try:
         main()
     except Exception as e:
         logger.error(f"Application error: {e}")
-        raise
\ No newline at end of file
+        raise
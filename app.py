@@ -86,12 +86,13 @@ async def receive_options_event(sport_name: str = '', league_name: str = '', typ
         
         ## get leagues
         base_query = """
-            SELECT DISTINCT league_uname, league_name
-            FROM events
-            WHERE sport_uname = %s 
-            AND event_type = 'prematch'
+            SELECT DISTINCT lg.uname, lg.name
+            FROM events e
+            JOIN leagues lg ON lg.league_id = e.league_id
+            WHERE e.sport_uname = %s 
+            AND e.event_type = 'prematch'
         """
-        archived_query = "AND archived_at = FALSE" if type == 'live' else "AND archived_at = TRUE"
+        archived_query = "AND e.archived_at = FALSE" if type == 'live' else "AND e.archived_at = TRUE"
         base_query += archived_query
 
         cursor.execute(base_query, (sport_name,))
@@ -106,20 +107,22 @@ async def receive_options_event(sport_name: str = '', league_name: str = '', typ
         archived_status = "FALSE" if type == 'live' else "TRUE"
 
         cursor.execute("""
-        SELECT DISTINCT team_name, team
-        FROM (
-            SELECT home_team_uname AS team_name, home_team AS team
+        SELECT DISTINCT t.uname AS team_name, t.name AS team
+        FROM teams t
+        JOIN (
+            SELECT home_team_id AS team_id
             FROM events
             WHERE sport_uname = %s
             AND event_type = 'prematch'
             AND archived_at = %s
-            UNION ALL
-            SELECT away_team_uname AS team_name, away_team AS team
+            UNION
+            SELECT away_team_id AS team_id
             FROM events
             WHERE sport_uname = %s
             AND event_type = 'prematch'
             AND archived_at = %s
-            ) AS combined_teams ORDER BY team ASC;
+            ) AS combined_teams ON combined_teams.team_id = t.team_id
+        ORDER BY team ASC;
         """, (sport_name, archived_status, sport_name, archived_status))
 
         teams = cursor.fetchall()
@@ -138,22 +141,24 @@ async def receive_options_event(sport_name: str = '', league_name: str = '', typ
 
         archived_status = "FALSE" if type == 'live' else "TRUE"
         cursor.execute("""
-        SELECT DISTINCT team_name, team
-        FROM (
-            SELECT home_team_uname AS team_name, home_team AS team
+        SELECT DISTINCT t.uname AS team_name, t.name AS team
+        FROM teams t
+        JOIN (
+            SELECT home_team_id AS team_id
             FROM events
             WHERE sport_uname = %s
-            AND league_uname = %s
+            AND league_id IN (SELECT league_id FROM leagues WHERE uname = %s)
             AND event_type = 'prematch'
             AND archived_at = %s
-            UNION ALL
-            SELECT away_team_uname AS team_name, away_team AS team
+            UNION
+            SELECT away_team_id AS team_id
             FROM events
             WHERE sport_uname = %s
-            AND league_uname = %s
+            AND league_id IN (SELECT league_id FROM leagues WHERE uname = %s)
             AND event_type = 'prematch'
             AND archived_at = %s
-        ) AS combined_teams ORDER BY team ASC;
+        ) AS combined_teams ON combined_teams.team_id = t.team_id
+        ORDER BY team ASC;
         """, (sport_name, league_name, archived_status, sport_name, league_name, archived_status))
 
         teams = cursor.fetchall()
@@ -173,27 +178,23 @@ async def receive_event_info(sport_name: str = '', league_name: str = '', team_n
         archived_status = "FALSE" if type == 'live' else "TRUE"
 
         base_query = """
-            SELECT * FROM (
-                SELECT DISTINCT ON (e.event_id) e.event_id, 
-                    e.home_team,
-                    e.away_team,
-                    e.league_name,
-                    e.starts :: TIMESTAMP AS starts,
-                    l.created_at AT TIME ZONE 'UTC'
-                FROM
-                    events e
-                JOIN api_request_logs l ON l.event_id = e.event_id 
-                WHERE
-                    e.sport_uname = %s
-                    AND e.league_uname = %s 
-                    AND e.event_type = 'prematch'
-                    AND e.archived_at = %s
-                ORDER BY
-                    e.event_id,
-                    l.created_at DESC 
-            ) AS tmp 
+            SELECT
+                e.event_id,
+                e.home_team,
+                e.away_team,
+                e.league_name,
+                e.starts :: TIMESTAMP AS starts,
+                l.seen_at AT TIME ZONE 'UTC'
+            FROM
+                events e
+            JOIN event_last_seen l ON l.event_id = e.event_id
+            WHERE
+                e.sport_uname = %s
+                AND e.league_id IN (SELECT league_id FROM leagues WHERE uname = %s)
+                AND e.event_type = 'prematch'
+                AND e.archived_at = %s
             ORDER BY
-                tmp.starts DESC;
+                e.starts DESC;
         """
 
         cursor.execute(base_query, (sport_name, league_name, archived_status))
@@ -215,27 +216,26 @@ async def receive_event_info(sport_name: str = '', league_name: str = '', team_n
         archived_status = "FALSE" if type == 'live' else "TRUE"
 
         base_query = """
-            SELECT * FROM (
-                SELECT DISTINCT ON (e.event_id) e.event_id, 
-                    e.home_team,
-                    e.away_team,
-                    e.league_name,
-                    e.starts :: TIMESTAMP AS starts,
-                    l.created_at AT TIME ZONE 'UTC'
-                FROM
-                    events e
-                JOIN api_request_logs l ON l.event_id = e.event_id 
-                WHERE
-                    e.sport_uname = %s
-                    AND (e.home_team_uname = %s OR e.away_team_uname = %s)
-                    AND e.event_type = 'prematch'
-                    AND e.archived_at = %s
-                ORDER BY
-                    e.event_id,
-                    l.created_at DESC 
-            ) AS tmp 
+            SELECT
+                e.event_id,
+                e.home_team,
+                e.away_team,
+                e.league_name,
+                e.starts :: TIMESTAMP AS starts,
+                l.seen_at AT TIME ZONE 'UTC'
+            FROM
+                events e
+            JOIN event_last_seen l ON l.event_id = e.event_id
+            WHERE
+                e.sport_uname = %s
+                AND (
+                    e.home_team_id IN (SELECT team_id FROM teams WHERE uname = %s)
+                    OR e.away_team_id IN (SELECT team_id FROM teams WHERE uname = %s)
+                )
+                AND e.event_type = 'prematch'
+                AND e.archived_at = %s
             ORDER BY
-                tmp.starts DESC;
+                e.starts DESC;
         """
 
         cursor.execute(base_query, (sport_name, team_name, team_name, archived_status))
@@ -257,28 +257,27 @@ async def receive_event_info(sport_name: str = '', league_name: str = '', team_n
         archived_status = "FALSE" if type == 'live' else "TRUE"
 
         base_query = """
-            SELECT * FROM (
-                SELECT DISTINCT ON (e.event_id) e.event_id, 
-                    e.home_team,
-                    e.away_team,
-                    e.league_name,
-                    e.starts :: TIMESTAMP AS starts,
-                    l.created_at AT TIME ZONE 'UTC'
-                FROM
-                    events e
-                JOIN api_request_logs l ON l.event_id = e.event_id 
-                WHERE
-                    e.sport_uname = %s
-                    AND e.league_uname = %s 
-                    AND ( e.home_team_uname = %s OR e.away_team_uname = %s )
-                    AND e.event_type = 'prematch'
-                    AND e.archived_at = %s
-                ORDER BY
-                    e.event_id,
-                    l.created_at DESC 
-            ) AS tmp 
+            SELECT
+                e.event_id,
+                e.home_team,
+                e.away_team,
+                e.league_name,
+                e.starts :: TIMESTAMP AS starts,
+                l.seen_at AT TIME ZONE 'UTC'
+            FROM
+                events e
+            JOIN event_last_seen l ON l.event_id = e.event_id
+            WHERE
+                e.sport_uname = %s
+                AND e.league_id IN (SELECT league_id FROM leagues WHERE uname = %s)
+                AND (
+                    e.home_team_id IN (SELECT team_id FROM teams WHERE uname = %s)
+                    OR e.away_team_id IN (SELECT team_id FROM teams WHERE uname = %s)
+                )
+                AND e.event_type = 'prematch'
+                AND e.archived_at = %s
             ORDER BY
-                tmp.starts DESC;
+                e.starts DESC;
         """
 
         cursor.execute(base_query, (sport_name, league_name, team_name, team_name, archived_status))
@@ -300,26 +299,25 @@ async def receive_event_info(sport_name: str = '', league_name: str = '', team_n
         archived_status = "FALSE" if type == 'live' else "TRUE"
 
         base_query = """
-            SELECT * FROM (
-                SELECT DISTINCT ON (e.event_id) e.event_id, 
-                    e.home_team,
-                    e.away_team,
-                    e.league_name,
-                    e.starts :: TIMESTAMP AS starts,
-                    l.created_at AT TIME ZONE 'UTC'
-                FROM
-                    events e
-                JOIN api_request_logs l ON l.event_id = e.event_id 
-                WHERE
-                    ( e.home_team_uname = %s OR e.away_team_uname = %s )
-                    AND e.event_type = 'prematch'
-                    AND e.archived_at = %s
-                ORDER BY
-                    e.event_id,
-                    l.created_at DESC 
-            ) AS tmp 
+            SELECT
+                e.event_id,
+                e.home_team,
+                e.away_team,
+                e.league_name,
+                e.starts :: TIMESTAMP AS starts,
+                l.seen_at AT TIME ZONE 'UTC'
+            FROM
+                events e
+            JOIN event_last_seen l ON l.event_id = e.event_id
+            WHERE
+                (
+                    e.home_team_id IN (SELECT team_id FROM teams WHERE uname = %s)
+                    OR e.away_team_id IN (SELECT team_id FROM teams WHERE uname = %s)
+                )
+                AND e.event_type = 'prematch'
+                AND e.archived_at = %s
             ORDER BY
-                tmp.starts DESC;
+                e.starts DESC;
         """
 
         cursor.execute(base_query, (team_name, team_name, archived_status))
@@ -361,24 +359,25 @@ async def receive_event(event_id: str, type: str = 'live'):
         
         result = []
         for period in periods:
+            # Current prices come from the current_lines snapshot the collector maintains
+            time_condition = "AND p.cutoff >= c.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND p.archived_at = TRUE'
+
             # Money Lines Query to get the money_line data for a specific period_id
             base_query = """
                 SELECT
-                    ml.home_odds,
-                    ml.draw_odds,
-                    ml.away_odds,
-                    ml.max_bet,
-                    ml.time AT TIME ZONE 'UTC' AS time
+                    c.home_odds,
+                    c.draw_odds,
+                    c.away_odds,
+                    c.max_bet,
+                    c.time AT TIME ZONE 'UTC' AS time
                 FROM
-                    money_lines ml
-                JOIN periods p ON ml.period_id = p.period_id
+                    current_lines c
+                JOIN periods p ON c.period_id = p.period_id
                 WHERE
-                    p.period_id = %s
-            """
-            time_condition = "AND p.cutoff >= ml.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND ml.archived_at = TRUE'
-            complete_query = base_query + time_condition + """
-                ORDER BY ml.time DESC LIMIT 1
+                    c.period_id = %s
+                    AND c.market = 'money_lines'
             """
+            complete_query = base_query + time_condition
 
             cursor.execute(complete_query, (period))
             money_lines = cursor.fetchall()
@@ -402,36 +401,28 @@ async def receive_event(event_id: str, type: str = 'live'):
 
             # Spreads Query to get the spread data for a specific period_id
             base_query = """
-                SELECT DISTINCT ON ( handicap ) s.handicap,
-                    s.home_odds,
-                    s.away_odds,
-                    s.max_bet,
-                    s.time AT TIME ZONE 'UTC' AS time 
+                SELECT
+                    c.points,
+                    c.home_odds,
+                    c.away_odds,
+                    c.max_bet,
+                    c.time AT TIME ZONE 'UTC' AS time,
+                    c.is_open
                 FROM
-                    spreads s
-                JOIN periods P ON s.period_id = P.period_id 
+                    current_lines c
+                JOIN periods p ON c.period_id = p.period_id
                 WHERE
-                    s.period_id = %s 
+                    c.period_id = %s
+                    AND c.market = 'spreads'
             """
-            time_condition = "AND p.cutoff >= s.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND s.archived_at = TRUE'
             complete_query = base_query + time_condition + """
-                ORDER BY s.handicap, s.time DESC;
+                ORDER BY c.points;
             """
 
             cursor.execute(complete_query, (period,))
             spreads = cursor.fetchall()
 
             if spreads:
-                # Find the most recent time
-                most_recent_time = max(spreads, key=lambda x: x[4])[4]
-
-                # Filter totals to only include those with the most recent time
-                # recent_spreads = [spread for spread in spreads if spread[4] == most_recent_time]
-
-                # Determine the min and max points from the recent totals
-                # min_handicap = min(recent_spreads, key=lambda x: x[0])[0]
-                # max_handicap = max(recent_spreads, key=lambda x: x[0])[0]
-
                 spread_results = [
                     {
                         "handicap": spread[0],
@@ -442,7 +433,7 @@ async def receive_event(event_id: str, type: str = 'live'):
                         "max_bet": spread[3],
                         "vig": get_sum_vig('spread', [spread[1], spread[2]]),
                         "time": spread[4],
-                        "otb": most_recent_time > spread[4]
+                        "otb": not spread[5]
                     } for spread in spreads
                 ]
             else:
@@ -450,38 +441,28 @@ async def receive_event(event_id: str, type: str = 'live'):
 
             # Totals Query to get the total data for a specific period_id
             base_query = """
-                SELECT 
-                    DISTINCT ON (points)
-                    t.points, 
-                    t.over_odds, 
-                    t.under_odds, 
-                    t.max_bet,
-                    t.time AT TIME ZONE 'UTC' AS time
-                FROM 
-                    totals t
-                JOIN periods p ON t.period_id = p.period_id
-                WHERE 
-                    t.period_id = %s
+                SELECT
+                    c.points,
+                    c.over_odds,
+                    c.under_odds,
+                    c.max_bet,
+                    c.time AT TIME ZONE 'UTC' AS time,
+                    c.is_open
+                FROM
+                    current_lines c
+                JOIN periods p ON c.period_id = p.period_id
+                WHERE
+                    c.period_id = %s
+                    AND c.market = 'totals'
             """
-            time_condition = "AND p.cutoff >= t.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND t.archived_at = TRUE'
             complete_query = base_query + time_condition + """
-                ORDER BY t.points, t.time DESC;
+                ORDER BY c.points;
             """
 
             cursor.execute(complete_query, (period,))
             totals = cursor.fetchall()
 
             if totals:
-                # Find the most recent time
-                most_recent_time = max(totals, key=lambda x: x[4])[4]
-
-                # # Filter totals to only include those with the most recent time
-                # recent_totals = [total for total in totals if total[4] == most_recent_time]
-
-                # # Determine the min and max points from the recent totals
-                # min_points = min(recent_totals, key=lambda x: x[0])[0]
-                # max_points = max(recent_totals, key=lambda x: x[0])[0]
-
                 total_results = [
                     {
                         "points": total[0],
@@ -492,7 +473,7 @@ async def receive_event(event_id: str, type: str = 'live'):
                         "max_bet": total[3],
                         "vig": get_sum_vig('total', [total[1], total[2]]),
                         "time": total[4],
-                        "otb": most_recent_time > total[4]
+                        "otb": not total[5]
                     } for total in totals
                 ]
             else:
@@ -511,8 +492,60 @@ async def receive_event(event_id: str, type: str = 'live'):
         logger.error(f"Error in /receive-event: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
         
+# chart table -> (continuous aggregate prefix, line column, priced sides)
+CHART_SERIES = {
+    'spread': ('spreads', 'handicap', ['home', 'away']),
+    'money_line': ('money_lines', None, ['home', 'away']),
+    'total': ('totals', 'points', ['over', 'under'])
+}
+# Resolutions kept by the continuous aggregates from create_database.py
+CHART_RESOLUTIONS = ['1m', '1h']
+
+def get_chart_buckets(cursor, table: str, resolution: str, period_id: str, line: float, type: str):
+    """Read a line's OHLC buckets from the continuous aggregate of the given resolution"""
+    prefix, line_column, sides = CHART_SERIES[table]
+    columns = ', '.join(
+        f"c.{side}_{part}" for side in sides + ['limit'] for part in ['open', 'high', 'low', 'close']
+    )
+    query = f"""
+        SELECT c.bucket AT TIME ZONE 'UTC' AS time, {columns}
+        FROM {prefix}_{resolution} c
+        JOIN periods p ON c.period_id = p.period_id
+        WHERE c.period_id = %s
+    """
+    params = [period_id]
+    if line_column:
+        query += f" AND c.{line_column} = %s"
+        params.append(line)
+    query += " AND p.cutoff >= c.bucket AT TIME ZONE 'UTC'" if type == 'live' else ' AND p.archived_at = TRUE'
+    query += " ORDER BY c.bucket ASC"
+    cursor.execute(query, params)
+
+    result = []
+    for row in cursor.fetchall():
+        point = {'time': row[0].strftime('%m-%d %H:%M')}
+        for i, side in enumerate(sides + ['limit']):
+            ohlc = list(row[1 + 4 * i:5 + 4 * i])
+            # The close keeps the keys of the raw series, so the charts read either
+            point[side] = ohlc[3]
+            point[f'{side}_ohlc'] = ohlc
+        result.append(point)
+    return result
+
 @app.get("/receive-chart-event")
-async def receive_chart_event(period_id: str, hdp: float = None, points: float = None, table: str = None, type: str = 'live'):
+async def receive_chart_event(period_id: str, hdp: float = None, points: float = None, table: str = None, type: str = 'live', resolution: str = 'raw'):
+    if resolution != 'raw':
+        if resolution not in CHART_RESOLUTIONS or table not in CHART_SERIES:
+            raise HTTPException(status_code=400, detail="Unsupported chart table or resolution")
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            line = hdp if table == 'spread' else points
+            return {"message": "success", "data": get_chart_buckets(cursor, table, resolution, period_id, line, type)}
+        except Exception as e:
+            logger.error(f"Error in /receive-chart-event: {e}")
+            raise HTTPException(status_code=500, detail="An error occurred while fetching chart data")
+
     if table == 'spread':
         try: 
             # Add the received event_id to the storage
@@ -529,7 +562,7 @@ async def receive_chart_event(period_id: str, hdp: float = None, points: float =
                     JOIN periods p ON s.period_id = p.period_id
                     WHERE s.period_id = %s AND s.handicap = %s
             """
-            time_condition = "AND p.cutoff >= s.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND s.archived_at = TRUE'
+            time_condition = "AND p.cutoff >= s.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND p.archived_at = TRUE'
 
             complete_query = base_query + time_condition + """
                     ORDER BY s.time DESC) tmp 
@@ -566,7 +599,7 @@ async def receive_chart_event(period_id: str, hdp: float = None, points: float =
                     JOIN periods p ON ml.period_id = p.period_id
                     WHERE ml.period_id = %s
             """
-            time_condition = "AND p.cutoff >= ml.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND ml.archived_at = TRUE'
+            time_condition = "AND p.cutoff >= ml.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND p.archived_at = TRUE'
 
             complete_query = base_query + time_condition + """
                     ORDER BY ml.time DESC) tmp 
@@ -601,7 +634,7 @@ async def receive_chart_event(period_id: str, hdp: float = None, points: float =
                     JOIN periods p ON t.period_id = p.period_id
                     WHERE t.period_id = %s and t.points = %s
             """
-            time_condition = "AND p.cutoff >= t.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND t.archived_at = TRUE'
+            time_condition = "AND p.cutoff >= t.time AT TIME ZONE 'UTC'" if type == 'live' else 'AND p.archived_at = TRUE'
 
             complete_query = base_query + time_condition + """
                     ORDER BY t.time DESC) tmp 
@@ -53,22 +53,13 @@ class ArchiveManager:
                     # Begin transaction for this event
                     source_cur.execute("BEGIN")
 
-                    # Copy data to archive
-                    tables = ['events', 'periods', 'money_lines', 'spreads', 'totals']
+                    # Copy data to archive. Odds rows are left alone: their older chunks are
+                    # compressed by kickoff, and readers filter on periods.archived_at instead
+                    tables = ['events', 'periods']
 
                     # Delete data from source
                     for table in reversed(tables):  # Delete in reverse order due to foreign keys
-                        if table == 'events':
-                            source_cur.execute(f"UPDATE {table} SET archived_at = TRUE WHERE event_id = %s", (event_id,))
-                        elif table == 'periods':
-                            source_cur.execute(f"UPDATE {table} SET archived_at = TRUE WHERE event_id = %s", (event_id,))
-                        else:
-                            source_cur.execute(f"""
-                                UPDATE {table} SET archived_at = TRUE 
-                                WHERE period_id IN (
-                                    SELECT period_id FROM periods WHERE event_id = %s
-                                )
-                            """, (event_id,))
+                        source_cur.execute(f"UPDATE {table} SET archived_at = TRUE WHERE event_id = %s", (event_id,))
 
                     # Commit transaction for this event
                     source_cur.execute("COMMIT")
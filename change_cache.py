@@ -0,0 +1,164 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger('odds_collector')
+
+# Upper bound on cached market values across all events
+CACHE_MAX_ENTRIES: int = int(os.getenv('CACHE_MAX_ENTRIES', 500000))
+# Events are dropped this long after their start or last period cutoff,
+# matching when archive_data.py moves them out of the live set
+CACHE_EVICT_AFTER: timedelta = timedelta(minutes=int(os.getenv('ARCHIVE_INTERVAL', 10)))
+# How often expired events are swept out
+CACHE_PRUNE_INTERVAL: float = 60
+
+def parse_api_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse a Pinnacle timestamp into a naive UTC datetime"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def fingerprint(value: tuple) -> int:
+    """
+    Fixed-width fingerprint of a price tuple. Hashing the repr rather than the
+    tuple avoids CPython's numeric hash collisions, e.g. hash(-1.0) == hash(-2.0).
+    """
+    return hash(repr(value))
+
+class EventEntry:
+    """Change state of one event: a fingerprint per market key, its periods and its expiry"""
+    __slots__ = ('lines', 'periods', 'expires_at')
+
+    def __init__(self):
+        # market key -> fingerprint of the values last written
+        self.lines: Dict[tuple, int] = {}
+        # period_number -> (period_id, fingerprint of the period metadata last written)
+        self.periods: Dict[int, Tuple[int, int]] = {}
+        self.expires_at: Optional[datetime] = None
+
+class ChangeCache:
+    """
+    Fingerprints of the last written market values, grouped per event so whole
+    events can be evicted once they are over, and in least-recently-seen order
+    when the cache grows past its size cap.
+
+    Price tuples are reduced to fixed-width fingerprints, so each line costs
+    its key and one int instead of a dict of prices, and comparing a poll is a
+    single integer check. Keys are kept as they are: hashing them as well would
+    let lines such as handicaps -1.0 and -2.0 share a slot.
+    """
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, evict_after: timedelta = CACHE_EVICT_AFTER):
+        self.max_entries = max_entries
+        self.evict_after = evict_after
+        self.events: 'OrderedDict[int, EventEntry]' = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.last_prune = time.monotonic()
+
+    def entry(self, event_id: int) -> EventEntry:
+        entry = self.events.get(event_id)
+        if entry is None:
+            entry = self.events[event_id] = EventEntry()
+        return entry
+
+    def touch(self, event_id: int, expires_at: Optional[datetime]):
+        """Mark an event as seen in the current poll and record when it stops mattering"""
+        entry = self.entry(event_id)
+        self.events.move_to_end(event_id)
+        if expires_at is not None:
+            entry.expires_at = expires_at
+
+    def has_changed(self, event_id: int, key: tuple, value: tuple) -> bool:
+        """Check a market's prices against the cache, storing their fingerprint when they changed"""
+        lines = self.entry(event_id).lines
+        current = fingerprint(value)
+
+        previous = lines.get(key)
+        if previous is not None:
+            self.hits += 1
+            if previous == current:
+                return False
+        else:
+            self.misses += 1
+            self.size += 1
+
+        lines[key] = current
+        if self.size > self.max_entries:
+            self.evict_oldest()
+        return True
+
+    def seed(self, event_id: int, key: tuple, value: tuple):
+        """Store a fingerprint loaded from the database without counting it as a lookup"""
+        lines = self.entry(event_id).lines
+        if key not in lines:
+            self.size += 1
+        lines[key] = fingerprint(value)
+
+    def forget(self, event_id: int, key: tuple):
+        entry = self.events.get(event_id)
+        if entry is not None and entry.lines.pop(key, None) is not None:
+            self.size -= 1
+
+    def period_id(self, event_id: int, period_number: int, meta: tuple) -> Optional[int]:
+        """Return the stored period_id if the period's metadata is unchanged since it was written"""
+        entry = self.events.get(event_id)
+        if entry is None:
+            return None
+        cached = entry.periods.get(period_number)
+        if cached is not None and cached[1] == fingerprint(meta):
+            return cached[0]
+        return None
+
+    def remember_period(self, event_id: int, period_number: int, meta: tuple, period_id: int):
+        entry = self.events.get(event_id)
+        if entry is not None:
+            entry.periods[period_number] = (period_id, fingerprint(meta))
+
+    def evict(self, event_id: int):
+        entry = self.events.pop(event_id, None)
+        if entry is not None:
+            self.size -= len(entry.lines)
+            self.evictions += 1
+
+    def evict_oldest(self):
+        """Drop least recently seen events until the cache is back under its cap"""
+        while self.size > self.max_entries and len(self.events) > 1:
+            self.evict(next(iter(self.events)))
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """Evict events whose start and cutoffs are long past; runs at most once per interval"""
+        if time.monotonic() - self.last_prune < CACHE_PRUNE_INTERVAL:
+            return 0
+        self.last_prune = time.monotonic()
+
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        expired = [
+            event_id for event_id, entry in self.events.items()
+            if entry.expires_at is not None and entry.expires_at + self.evict_after < now
+        ]
+        for event_id in expired:
+            self.evict(event_id)
+
+        if expired:
+            logger.info(f"Evicted {len(expired)} finished events from change cache ({self.stats()})")
+        return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'events': len(self.events),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
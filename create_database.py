@@ -2,6 +2,7 @@ import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import logging
 from config import DB_CONFIG
+from migrations import apply_migrations
 from dotenv import load_dotenv
 import os
 
@@ -12,6 +13,22 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('database_manager')
 
+# Odds chunks are compressed once their newest rows are this many days old
+ODDS_COMPRESS_AFTER_DAYS: int = int(os.getenv('ODDS_COMPRESS_AFTER_DAYS', 7))
+
+# table -> (line columns, priced columns) of the chart aggregates
+CHART_AGGREGATES = {
+    'money_lines': ([], ['home_odds', 'draw_odds', 'away_odds']),
+    'spreads': (['handicap'], ['home_odds', 'away_odds']),
+    'totals': (['points'], ['over_odds', 'under_odds']),
+    'team_totals': (['team_type', 'points'], ['over_odds', 'under_odds'])
+}
+# resolution -> (bucket width, refresh start offset, refresh end offset, refresh interval)
+CHART_RESOLUTIONS = {
+    '1m': ('1 minute', '1 day', '1 minute', '1 minute'),
+    '1h': ('1 hour', '7 days', '1 hour', '30 minutes')
+}
+
 class DatabaseManager:
     def ensure_database_exists(self):
         """Ensure the database exists and create it if not."""
@@ -57,6 +74,13 @@ class DatabaseManager:
             );
             ''')
 
+            # The collector now logs once per poll instead of once per event
+            cur.execute('''
+            ALTER TABLE api_request_logs
+                ADD COLUMN IF NOT EXISTS sport_id INTEGER,
+                ADD COLUMN IF NOT EXISTS event_count INTEGER;
+            ''')
+
             cur.execute('''
             CREATE TABLE IF NOT EXISTS events (
                 event_id BIGINT PRIMARY KEY,
@@ -156,29 +180,154 @@ class DatabaseManager:
             );
             ''')
 
+            # Last poll that returned each event, one row per event
+            cur.execute('''
+            CREATE TABLE IF NOT EXISTS event_last_seen (
+                event_id BIGINT PRIMARY KEY,
+                since TEXT,
+                seen_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (event_id) REFERENCES events (event_id) ON DELETE CASCADE
+            );
+            ''')
+
+            # Latest `last` cursor each sport was written up to, so a restart resumes incrementally
+            cur.execute('''
+            CREATE TABLE IF NOT EXISTS collector_checkpoints (
+                sport_id INTEGER PRIMARY KEY,
+                last TEXT NOT NULL,
+                updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+            );
+            ''')
+
+            # Collector nodes sharing the sports; a node whose heartbeat lapses is considered dead
+            cur.execute('''
+            CREATE TABLE IF NOT EXISTS collector_nodes (
+                node_id TEXT PRIMARY KEY,
+                heartbeat_at TIMESTAMPTZ NOT NULL,
+                started_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+            );
+            ''')
+
+            # Which node polls each sport, valid until expires_at unless renewed
+            cur.execute('''
+            CREATE TABLE IF NOT EXISTS collector_leases (
+                sport_id INTEGER PRIMARY KEY,
+                node_id TEXT NOT NULL,
+                expires_at TIMESTAMPTZ NOT NULL
+            );
+            ''')
+
+            # Team and league dimensions, so events can be filtered on integer keys
+            cur.execute('''
+            CREATE TABLE IF NOT EXISTS leagues (
+                league_id INTEGER PRIMARY KEY,
+                sport_id INTEGER,
+                name TEXT,
+                uname TEXT
+            );
+            ''')
+
+            cur.execute('''
+            CREATE TABLE IF NOT EXISTS teams (
+                team_id SERIAL PRIMARY KEY,
+                sport_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                uname TEXT NOT NULL,
+                CONSTRAINT unique_sport_team UNIQUE (sport_id, uname)
+            );
+            ''')
+
+            cur.execute('''
+            ALTER TABLE events
+                ADD COLUMN IF NOT EXISTS home_team_id INTEGER REFERENCES teams (team_id),
+                ADD COLUMN IF NOT EXISTS away_team_id INTEGER REFERENCES teams (team_id);
+            ''')
+
+            # Fill the dimensions from events written before they existed
+            cur.execute('''
+            INSERT INTO leagues (league_id, sport_id, name, uname)
+            SELECT DISTINCT ON (league_id) league_id, sport_id, league_name, league_uname
+            FROM events
+            WHERE league_id IS NOT NULL
+            ORDER BY league_id, last_updated DESC
+            ON CONFLICT (league_id) DO NOTHING;
+            ''')
+
+            cur.execute('''
+            INSERT INTO teams (sport_id, name, uname)
+            SELECT DISTINCT ON (sport_id, uname) sport_id, name, uname
+            FROM (
+                SELECT sport_id, home_team AS name, home_team_uname AS uname FROM events WHERE home_team_id IS NULL
+                UNION ALL
+                SELECT sport_id, away_team AS name, away_team_uname AS uname FROM events WHERE away_team_id IS NULL
+            ) AS missing
+            WHERE sport_id IS NOT NULL AND uname IS NOT NULL
+            ORDER BY sport_id, uname
+            ON CONFLICT (sport_id, uname) DO NOTHING;
+            ''')
+
+            cur.execute('''
+            UPDATE events e SET
+                home_team_id = h.team_id,
+                away_team_id = a.team_id
+            FROM teams h, teams a
+            WHERE (e.home_team_id IS NULL OR e.away_team_id IS NULL)
+            AND h.sport_id = e.sport_id AND h.uname = e.home_team_uname
+            AND a.sport_id = e.sport_id AND a.uname = e.away_team_uname;
+            ''')
+
+            # Spooled batches already written, so a replay retried after a crash is skipped
+            cur.execute('''
+            CREATE TABLE IF NOT EXISTS spool_replays (
+                record_id TEXT PRIMARY KEY,
+                replayed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+            );
+            ''')
+
+            # Carry over the latest per-event request log written before event_last_seen existed
+            cur.execute('''
+            INSERT INTO event_last_seen (event_id, since, seen_at)
+            SELECT DISTINCT ON (l.event_id) l.event_id, l.since, l.created_at
+            FROM api_request_logs l
+            JOIN events e ON e.event_id = l.event_id
+            WHERE NOT EXISTS (SELECT 1 FROM event_last_seen)
+            ORDER BY l.event_id, l.created_at DESC
+            ON CONFLICT (event_id) DO NOTHING;
+            ''')
+
             # Convert tables to hypertables
             for table in ['money_lines', 'spreads', 'totals', 'team_totals']:
                 cur.execute(f"SELECT create_hypertable('{table}', 'time', if_not_exists => TRUE);")
 
+            # Compress aged chunks. Segmenting by period_id keeps a period's history together,
+            # so chart reads touch a single segment. Odds rows are never updated once written;
+            # the archiver marks events and periods, which readers join on.
+            # The settings cannot change once chunks are compressed, so they are only set once.
+            for table in ['money_lines', 'spreads', 'totals', 'team_totals']:
+                cur.execute('''
+                SELECT compression_enabled FROM timescaledb_information.hypertables
+                WHERE hypertable_name = %s;
+                ''', (table,))
+                row = cur.fetchone()
+                if row and not row[0]:
+                    cur.execute(f"ALTER TABLE {table} SET (timescaledb.compress, timescaledb.compress_segmentby = 'period_id', timescaledb.compress_orderby = 'time DESC');")
+                cur.execute(f"SELECT add_compression_policy('{table}', make_interval(days => %s), if_not_exists => TRUE);", (ODDS_COMPRESS_AFTER_DAYS,))
+
             # Commit changes and close
             conn.commit()
             logger.info("All tables created or verified successfully.")
 
-            # Create indexes
+            # Create indexes; the query-tuned ones live in migrations/
             indexes = [
                 "CREATE INDEX IF NOT EXISTS idx_events_sport_id ON events(sport_id);",
                 "CREATE INDEX IF NOT EXISTS idx_events_league_id ON events(league_id);",
                 "CREATE INDEX IF NOT EXISTS idx_periods_event_id ON periods(event_id);",
-                "CREATE INDEX IF NOT EXISTS idx_money_lines_period_id ON money_lines(period_id);",
-                "CREATE INDEX IF NOT EXISTS idx_spreads_period_id ON spreads(period_id);",
-                "CREATE INDEX IF NOT EXISTS idx_totals_period_id ON totals(period_id);",
-                "CREATE INDEX IF NOT EXISTS idx_team_totals_period_id ON team_totals(period_id);",
-                "CREATE INDEX IF NOT EXISTS idx_events_home_team ON events(home_team);",
-                "CREATE INDEX IF NOT EXISTS idx_events_away_team ON events(away_team);",
                 "CREATE INDEX IF NOT EXISTS idx_events_sport_league ON events(sport_id, league_id);",
                 "CREATE INDEX IF NOT EXISTS idx_events_sport_league_type_start ON events (sport_id, league_id, event_type, event_id, starts DESC);",
                 "CREATE INDEX IF NOT EXISTS idx_events_filter_sort ON events (sport_id, event_type, home_team, away_team, event_id, starts DESC);",
-                "CREATE INDEX IF NOT EXISTS idx_api_request_logs_event_id_created_at ON api_request_logs (event_id, created_at DESC);"
+                "CREATE INDEX IF NOT EXISTS idx_api_request_logs_event_id_created_at ON api_request_logs (event_id, created_at DESC);",
+                "CREATE INDEX IF NOT EXISTS idx_leagues_uname ON leagues (uname);",
+                "CREATE INDEX IF NOT EXISTS idx_teams_uname ON teams (uname);"
             ]
 
             for index_query in indexes:
@@ -194,6 +343,56 @@ class DatabaseManager:
             logger.error(f"Error creating tables: {e}")
             raise
 
+    def ensure_chart_aggregates(self):
+        """Create the per-minute and per-hour OHLC continuous aggregates the charts read."""
+        try:
+            conn = psycopg2.connect(**DB_CONFIG)
+            # Creating a continuous aggregate with data cannot run inside a transaction
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            cur = conn.cursor()
+
+            for table, (lines, prices) in CHART_AGGREGATES.items():
+                columns = []
+                for column in prices + ['max_bet']:
+                    name = 'limit' if column == 'max_bet' else column[:-len('_odds')]
+                    columns += [
+                        f"first({column}, time) AS {name}_open",
+                        f"max({column}) AS {name}_high",
+                        f"min({column}) AS {name}_low",
+                        f"last({column}, time) AS {name}_close"
+                    ]
+                group = ', '.join(['bucket', 'period_id'] + lines)
+
+                for resolution, (width, start_offset, end_offset, schedule) in CHART_RESOLUTIONS.items():
+                    view = f"{table}_{resolution}"
+                    # materialized_only = false adds the not yet refreshed buckets at query time
+                    cur.execute(f'''
+                    CREATE MATERIALIZED VIEW IF NOT EXISTS {view}
+                    WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+                    SELECT
+                        time_bucket(INTERVAL '{width}', time) AS bucket,
+                        {', '.join(['period_id'] + lines)},
+                        {', '.join(columns)}
+                    FROM {table}
+                    GROUP BY {group}
+                    WITH DATA;
+                    ''')
+                    cur.execute(f'''
+                    SELECT add_continuous_aggregate_policy('{view}',
+                        start_offset => INTERVAL '{start_offset}',
+                        end_offset => INTERVAL '{end_offset}',
+                        schedule_interval => INTERVAL '{schedule}',
+                        if_not_exists => TRUE);
+                    ''')
+                    logger.info(f"Continuous aggregate {view} ensured.")
+
+            cur.close()
+            conn.close()
+
+        except Exception as e:
+            logger.error(f"Error creating chart aggregates: {e}")
+            raise
+
     def verify_tables(self):
         """Verify if the necessary tables exist."""
         try:
@@ -201,7 +400,7 @@ class DatabaseManager:
             cur = conn.cursor()
 
             # Check if the expected tables exist
-            expected_tables = ['events', 'periods', 'money_lines', 'spreads', 'totals', 'team_totals']
+            expected_tables = ['events', 'event_last_seen', 'collector_checkpoints', 'collector_nodes', 'collector_leases', 'leagues', 'teams', 'periods', 'money_lines', 'spreads', 'totals', 'team_totals', 'current_lines']
             for table in expected_tables:
                 cur.execute(f"SELECT to_regclass('{table}');")
                 result = cur.fetchone()
@@ -448,6 +647,8 @@ if __name__ == "__main__":
     db = DatabaseManager()
     db.ensure_database_exists()
     db.ensure_tables_exist()
+    db.ensure_chart_aggregates()
+    apply_migrations()
     # db.ensure_archive_database_exists()
     # db.ensure_archive_tables_exist()
     db.setup_triggers()
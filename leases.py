@@ -0,0 +1,122 @@
+import logging
+import math
+import os
+import random
+import socket
+from typing import List, Set, Tuple
+
+logger = logging.getLogger('odds_collector')
+
+# Identifies this process in collector_nodes and collector_leases
+COLLECTOR_NODE_ID: str = os.getenv('COLLECTOR_NODE_ID') or f'{socket.gethostname()}-{os.getpid()}'
+# A lease, and a node's membership, lapse when not renewed for this many seconds
+LEASE_TTL: float = float(os.getenv('LEASE_TTL', 30))
+# How often leases are renewed and the sports rebalanced
+LEASE_RENEW_INTERVAL: float = float(os.getenv('LEASE_RENEW_INTERVAL', 10))
+
+class LeaseManager:
+    """
+    Splits the sports between collector nodes through the collector_leases table.
+    Every node heartbeats into collector_nodes, renews the leases it holds and
+    evens out to ceil(sports / live nodes): it hands back leases above that share
+    and claims free or expired ones below it. A node that dies stops renewing,
+    so its leases expire after LEASE_TTL and the others pick its sports up.
+    """
+    def __init__(self, pool, sport_ids: List[int], node_id: str = COLLECTOR_NODE_ID):
+        self.pool = pool
+        self.sport_ids = list(sport_ids)
+        self.node_id = node_id
+
+    def balance(self) -> Tuple[Set[int], Set[int], int]:
+        """
+        Heartbeat, renew and claim in one transaction. Returns the sports to
+        poll, the sports to hand back once their collectors stopped, and the
+        number of live nodes.
+        """
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute('''
+                    INSERT INTO collector_nodes (node_id, heartbeat_at) VALUES (%s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (node_id) DO UPDATE SET heartbeat_at = EXCLUDED.heartbeat_at
+                ''', (self.node_id,))
+                cur.execute('''
+                    DELETE FROM collector_nodes WHERE heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                ''', (LEASE_TTL,))
+                cur.execute("SELECT COUNT(*) FROM collector_nodes")
+                live_nodes = max(1, cur.fetchone()[0])
+
+                cur.execute('''
+                    UPDATE collector_leases SET expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                    WHERE node_id = %s
+                    RETURNING sport_id
+                ''', (LEASE_TTL, self.node_id))
+                owned = {row[0] for row in cur.fetchall()}
+
+                share = math.ceil(len(self.sport_ids) / live_nodes)
+                release = set(sorted(owned)[share:])
+                owned -= release
+
+                if len(owned) < share:
+                    cur.execute('''
+                        SELECT s FROM unnest(%s::INTEGER[]) AS s
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM collector_leases l
+                            WHERE l.sport_id = s AND l.expires_at >= CURRENT_TIMESTAMP
+                        )
+                    ''', (self.sport_ids,))
+                    free = [row[0] for row in cur.fetchall()]
+                    # Nodes claiming at the same moment rarely go for the same sports
+                    random.shuffle(free)
+                    candidates = free[:share - len(owned)]
+                    if candidates:
+                        # The conditional upsert only takes a lease nobody else renewed in the meantime
+                        cur.execute('''
+                            INSERT INTO collector_leases (sport_id, node_id, expires_at)
+                            SELECT s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s) FROM unnest(%s::INTEGER[]) AS s
+                            ON CONFLICT (sport_id) DO UPDATE SET
+                                node_id = EXCLUDED.node_id,
+                                expires_at = EXCLUDED.expires_at
+                            WHERE collector_leases.expires_at < CURRENT_TIMESTAMP
+                            RETURNING sport_id
+                        ''', (self.node_id, LEASE_TTL, candidates))
+                        owned.update(row[0] for row in cur.fetchall())
+
+                conn.commit()
+                return owned, release, live_nodes
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def release(self, sport_ids: Set[int]):
+        """Hand leases back; call only after the sports stopped polling"""
+        if not sport_ids:
+            return
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute('''
+                    DELETE FROM collector_leases WHERE node_id = %s AND sport_id = ANY(%s::INTEGER[])
+                ''', (self.node_id, list(sport_ids)))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def leave(self):
+        """Drop this node and all its leases so the other nodes take over right away"""
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("DELETE FROM collector_leases WHERE node_id = %s", (self.node_id,))
+                cur.execute("DELETE FROM collector_nodes WHERE node_id = %s", (self.node_id,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger('odds_collector')
+
+# Local endpoint serving the metrics in Prometheus text format, 0 disables it
+METRICS_HOST: str = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT: int = int(os.getenv('METRICS_PORT', 9108))
+
+# name -> (type, help)
+DEFINITIONS: Dict[str, Tuple[str, str]] = {
+    'odds_stage_seconds': ('summary', 'Time spent per poll in each ingest stage'),
+    'odds_write_seconds': ('summary', 'Time spent writing each table'),
+    'odds_polls_total': ('counter', 'Polls of the markets endpoint that returned events'),
+    'odds_poll_events_total': ('counter', 'Events received from the markets endpoint'),
+    'odds_changed_events_total': ('counter', 'Events with at least one changed market'),
+    'odds_rows_written_total': ('counter', 'Rows written per table'),
+    'odds_db_round_trips_total': ('counter', 'Statements sent to the database, commits included'),
+    'odds_poll_rows': ('summary', 'Rows written per poll'),
+    'odds_poll_db_round_trips': ('summary', 'Database round trips per poll'),
+    'odds_write_failures_total': ('counter', 'Batches whose write failed'),
+    'odds_spooled_batches_total': ('counter', 'Batches spooled to disk while the database was unreachable'),
+    'odds_replayed_batches_total': ('counter', 'Spooled batches written after the database came back'),
+    'odds_fetch_errors_total': ('counter', 'Polls that failed or broke off before the whole body arrived'),
+    'odds_change_cache_entries': ('gauge', 'Market fingerprints held in the change cache'),
+    'odds_change_cache_events': ('gauge', 'Events held in the change cache'),
+    'odds_change_cache_hits_total': ('counter', 'Change cache lookups that found a previous value'),
+    'odds_change_cache_misses_total': ('counter', 'Change cache lookups for values never seen before'),
+    'odds_change_cache_evictions_total': ('counter', 'Events evicted from the change cache'),
+    'odds_poll_interval_seconds': ('gauge', 'Current scheduled interval between polls of a sport'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+class Metrics:
+    """
+    Counters, gauges and summaries for the collector. Updates come from the
+    event loop and from the database worker threads, so they share a lock.
+    Gauges that mirror other objects are read through callbacks at scrape time.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values: Dict[str, Dict[Labels, float]] = {}
+        # Summaries keep [count, sum] per label set
+        self.summaries: Dict[str, Dict[Labels, list]] = {}
+        self.callbacks: list = []
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self.lock:
+            self.values.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self.lock:
+            summary = self.summaries.setdefault(name, {}).setdefault(key, [0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    def register(self, callback: Callable[['Metrics'], None]):
+        """Run callback before each scrape, to copy gauges from other objects"""
+        self.callbacks.append(callback)
+
+    def render(self) -> str:
+        for callback in self.callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"Metrics callback failed: {e}")
+
+        lines = []
+        with self.lock:
+            for name in sorted(set(self.values) | set(self.summaries)):
+                kind, help_text = DEFINITIONS.get(name, ('untyped', name))
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in sorted(self.values.get(name, {}).items()):
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                for labels, (count, total) in sorted(self.summaries.get(name, {}).items()):
+                    lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                    lines.append(f'{name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+METRICS = Metrics()
+
+async def start_metrics_server(metrics: Metrics = METRICS, host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Serve /metrics; returns the runner to clean up, or None when disabled"""
+    if not port:
+        return None
+
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(body=metrics.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.error(f"Could not start metrics endpoint on {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,136 @@
+import logging
+import os
+import re
+from typing import List, Tuple
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from dotenv import load_dotenv
+from config import DB_CONFIG
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('database_manager')
+
+# Folder of NNNN_name.sql files, applied in version order
+MIGRATIONS_DIR: str = os.getenv('MIGRATIONS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+# First line of a migration that must run outside a transaction, e.g. for CREATE INDEX CONCURRENTLY
+NO_TRANSACTION_FLAG = '-- migrate: no-transaction'
+# Advisory lock key that keeps two runners from applying the same migration
+MIGRATION_LOCK_ID = 4_021_771
+
+ONLINE_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(CONCURRENTLY\s+)?IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE)
+PER_CHUNK_INDEX = re.compile(r'timescaledb\.transaction_per_chunk', re.IGNORECASE)
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Tuple[str, str, str]]:
+    """(version, name, sql) of every migration file, in version order"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = re.fullmatch(r'(\d+)_(\w+)\.sql', filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename)) as f:
+            migrations.append((match.group(1), match.group(2), f.read()))
+    return migrations
+
+def split_statements(sql: str) -> List[str]:
+    """
+    Split a no-transaction migration into statements, each sent on its own.
+    Statements end with a semicolon at the end of a line; dollar-quoted bodies
+    belong in transactional migrations, which are sent whole.
+    """
+    statements = []
+    current = []
+    for line in sql.splitlines():
+        if not current and (not line.strip() or line.strip().startswith('--')):
+            continue
+        current.append(line)
+        if line.rstrip().endswith(';'):
+            statements.append('\n'.join(current))
+            current = []
+    if current:
+        statements.append('\n'.join(current))
+    return statements
+
+def online_index(statement: str) -> Tuple[str, bool]:
+    """
+    Name of the index an online build creates, and whether it is built concurrently,
+    or ('', False) for any other statement. Both a CONCURRENTLY build and a
+    TimescaleDB transaction_per_chunk build leave an invalid index when interrupted.
+    """
+    match = ONLINE_INDEX.search(statement)
+    if not match or not (match.group(1) or PER_CHUNK_INDEX.search(statement)):
+        return '', False
+    return match.group(2), bool(match.group(1))
+
+def drop_invalid_index(cur, statement: str):
+    """An interrupted online build leaves an invalid index that IF NOT EXISTS would keep"""
+    name, concurrent = online_index(statement)
+    if not name:
+        return
+    cur.execute('''
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    ''', (name,))
+    if cur.fetchone():
+        logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+        # Hypertables do not support DROP INDEX CONCURRENTLY
+        cur.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrent else ''}IF EXISTS {name};")
+
+def apply_migrations(directory: str = MIGRATIONS_DIR) -> List[str]:
+    """Apply the migrations not yet recorded in schema_migrations; returns their versions"""
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cur = conn.cursor()
+    applied_now = []
+    try:
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+        ''')
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        cur.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cur.fetchall()}
+
+        for version, name, sql in load_migrations(directory):
+            if version in applied:
+                continue
+            logger.info(f"Applying migration {version}_{name}")
+
+            if sql.lstrip().startswith(NO_TRANSACTION_FLAG):
+                # Every statement commits on its own, so these files must be safe to re-run;
+                # invalid indexes from an interrupted online build are rebuilt
+                for statement in split_statements(sql):
+                    drop_invalid_index(cur, statement)
+                    cur.execute(statement)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            else:
+                cur.execute("BEGIN")
+                try:
+                    cur.execute(sql)
+                    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                    cur.execute("COMMIT")
+                except Exception:
+                    cur.execute("ROLLBACK")
+                    raise
+
+            applied_now.append(version)
+            logger.info(f"Migration {version}_{name} applied.")
+
+        if not applied_now:
+            logger.info("Schema is up to date.")
+        return applied_now
+    except Exception as e:
+        logger.error(f"Error applying migrations: {e}")
+        raise
+    finally:
+        # Closing the session also releases the advisory lock
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    apply_migrations()
@@ -0,0 +1,39 @@
+-- migrate: no-transaction
+-- Indexes matching the query shapes of app.py and the collector's cache warm-up.
+-- events is indexed concurrently. Hypertables do not support CONCURRENTLY, so
+-- their indexes are built one chunk per transaction, which keeps inserts going.
+
+-- Latest money line and the charts: WHERE period_id = ? ORDER BY time DESC
+CREATE INDEX IF NOT EXISTS idx_money_lines_period_time ON money_lines (period_id, time DESC)
+    WITH (timescaledb.transaction_per_chunk);
+
+-- Current board and per-line charts: DISTINCT ON (handicap / points) ... ORDER BY line, time DESC
+CREATE INDEX IF NOT EXISTS idx_spreads_period_handicap_time ON spreads (period_id, handicap, time DESC)
+    WITH (timescaledb.transaction_per_chunk);
+CREATE INDEX IF NOT EXISTS idx_totals_period_points_time ON totals (period_id, points, time DESC)
+    WITH (timescaledb.transaction_per_chunk);
+CREATE INDEX IF NOT EXISTS idx_team_totals_period_team_time ON team_totals (period_id, team_type, time DESC)
+    WITH (timescaledb.transaction_per_chunk);
+
+-- Plain period_id indexes are prefixes of the ones above
+DROP INDEX IF EXISTS idx_money_lines_period_id;
+DROP INDEX IF EXISTS idx_spreads_period_id;
+DROP INDEX IF EXISTS idx_totals_period_id;
+DROP INDEX IF EXISTS idx_team_totals_period_id;
+
+-- Every app.py event query is prematch, filters archived_at and sorts by starts.
+-- League and team filters arrive as id lists from the leagues and teams tables.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_sport_uname_archived ON events (sport_uname, archived_at, starts DESC)
+    WHERE event_type = 'prematch';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_league_archived ON events (league_id, archived_at, starts DESC)
+    WHERE event_type = 'prematch';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_home_team_archived ON events (home_team_id, archived_at, starts DESC)
+    WHERE event_type = 'prematch';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_away_team_archived ON events (away_team_id, archived_at, starts DESC)
+    WHERE event_type = 'prematch';
+
+-- Superseded by the team id indexes; team names are no longer filtered on
+DROP INDEX CONCURRENTLY IF EXISTS idx_events_home_team;
+DROP INDEX CONCURRENTLY IF EXISTS idx_events_away_team;
+DROP INDEX CONCURRENTLY IF EXISTS idx_events_home_team_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_events_away_team_id;
@@ -0,0 +1,57 @@
+-- Latest price of every line, upserted by the collector with each history insert so
+-- the current board is a primary-key lookup. line is '' for the money line, the
+-- handicap or points as float8 text for spreads and totals, the side for team totals.
+-- time is when the price last moved, updated_at when a poll last wrote the row or
+-- its is_open state; writes from an older poll, e.g. a late spool replay, are ignored.
+CREATE TABLE IF NOT EXISTS current_lines (
+    period_id BIGINT NOT NULL,
+    market TEXT NOT NULL,
+    line TEXT NOT NULL,
+    points DECIMAL,
+    team_type TEXT,
+    alt_line_id BIGINT,
+    home_odds DECIMAL,
+    draw_odds DECIMAL,
+    away_odds DECIMAL,
+    over_odds DECIMAL,
+    under_odds DECIMAL,
+    max_bet DECIMAL,
+    time TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL,
+    is_open BOOLEAN NOT NULL DEFAULT TRUE,
+    PRIMARY KEY (period_id, market, line),
+    FOREIGN KEY (period_id) REFERENCES periods (period_id) ON DELETE CASCADE
+);
+
+-- Seed from history. Only changed lines are stored, so a line's last write says nothing
+-- about whether it is still offered: every line starts open, and the collector closes
+-- the ones missing from the next poll of their event.
+INSERT INTO current_lines (period_id, market, line, home_odds, draw_odds, away_odds, max_bet, time, updated_at)
+SELECT DISTINCT ON (period_id) period_id, 'money_lines', '', home_odds, draw_odds, away_odds, max_bet, time, time
+FROM money_lines
+WHERE period_id IS NOT NULL
+ORDER BY period_id, time DESC
+ON CONFLICT DO NOTHING;
+
+INSERT INTO current_lines (period_id, market, line, points, alt_line_id, home_odds, away_odds, max_bet, time, updated_at)
+SELECT DISTINCT ON (period_id, handicap)
+    period_id, 'spreads', handicap::float8::text, handicap, alt_line_id, home_odds, away_odds, max_bet, time, time
+FROM spreads
+WHERE period_id IS NOT NULL AND handicap IS NOT NULL
+ORDER BY period_id, handicap, time DESC
+ON CONFLICT DO NOTHING;
+
+INSERT INTO current_lines (period_id, market, line, points, alt_line_id, over_odds, under_odds, max_bet, time, updated_at)
+SELECT DISTINCT ON (period_id, points)
+    period_id, 'totals', points::float8::text, points, alt_line_id, over_odds, under_odds, max_bet, time, time
+FROM totals
+WHERE period_id IS NOT NULL AND points IS NOT NULL
+ORDER BY period_id, points, time DESC
+ON CONFLICT DO NOTHING;
+
+INSERT INTO current_lines (period_id, market, line, points, team_type, over_odds, under_odds, max_bet, time, updated_at)
+SELECT DISTINCT ON (period_id, team_type) period_id, 'team_totals', team_type, points, team_type, over_odds, under_odds, max_bet, time, time
+FROM team_totals
+WHERE period_id IS NOT NULL AND team_type IS NOT NULL
+ORDER BY period_id, team_type, time DESC
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,207 @@
+"""
+Local stand-in for the Pinnacle /sports and /markets endpoints, so the collector
+can be exercised without spending API quota.
+
+Synthetic mode generates sports full of events and moves a share of their prices
+every tick. Replay mode serves recorded /markets responses (one JSON document per
+line) in order, per sport. Both honour the since cursor the way the real API does:
+a request without since gets everything, later ones only what changed.
+
+    python mock_pinnacle.py --sports 3 --events 2000 --change-rate 0.05
+    python mock_pinnacle.py --replay recorded_markets.jsonl
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger('mock_pinnacle')
+
+SPORT_NAMES = ['Soccer', 'Tennis', 'Basketball', 'Hockey', 'Baseball', 'Football', 'Volleyball', 'Handball']
+
+def random_price(rng: random.Random) -> float:
+    return round(rng.uniform(1.3, 4.5), 3)
+
+def make_period(rng: random.Random, number: int, cutoff: str, lines: int) -> Dict[str, Any]:
+    spreads = {}
+    totals = {}
+    for i in range(lines):
+        hdp = (i - lines // 2) * 0.25
+        spreads[str(hdp)] = {'hdp': hdp, 'alt_line_id': None if i == lines // 2 else rng.randint(1, 10 ** 9),
+                             'home': random_price(rng), 'away': random_price(rng), 'max': 1000.0}
+        points = 2.5 + i * 0.25
+        totals[str(points)] = {'points': points, 'alt_line_id': None if i == 0 else rng.randint(1, 10 ** 9),
+                               'over': random_price(rng), 'under': random_price(rng), 'max': 500.0}
+    return {
+        'line_id': rng.randint(1, 10 ** 9),
+        'number': number,
+        'description': 'Match' if number == 0 else '1st Half',
+        'cutoff': cutoff,
+        'period_status': 1,
+        'money_line': {'home': random_price(rng), 'draw': random_price(rng), 'away': random_price(rng)},
+        'spreads': spreads,
+        'totals': totals,
+        'team_total': {
+            'home': {'points': 1.5, 'over': random_price(rng), 'under': random_price(rng)},
+            'away': {'points': 1.5, 'over': random_price(rng), 'under': random_price(rng)}
+        },
+        'meta': {'number': number, 'max_money_line': 500.0, 'max_spread': 1000.0, 'max_total': 500.0, 'max_team_total': 250.0}
+    }
+
+def make_event(rng: random.Random, sport_id: int, event_id: int, lines: int) -> Dict[str, Any]:
+    starts = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(minutes=rng.randint(5, 3 * 24 * 60))
+    starts = starts.strftime('%Y-%m-%dT%H:%M:%SZ')
+    league = rng.randint(1, 50)
+    return {
+        'event_id': event_id,
+        'sport_id': sport_id,
+        'league_id': sport_id * 1000 + league,
+        'league_name': f'Mock League {league}',
+        'starts': starts,
+        'last': 0,
+        'home': f'Home Team {event_id}',
+        'away': f'Away Team {event_id}',
+        'event_type': 'prematch',
+        'live_status_id': 0,
+        'parent_id': None,
+        'resulting_unit': 'Regular',
+        'is_actual': True,
+        'home_score': 0,
+        'away_score': 0,
+        'is_have_odds': True,
+        'periods': {
+            'num_0': make_period(rng, 0, starts, lines),
+            'num_1': make_period(rng, 1, starts, lines)
+        }
+    }
+
+class SyntheticMarkets:
+    """Generated sports whose prices drift a little every tick"""
+    def __init__(self, sports: int, events: int, lines: int, change_rate: float, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.change_rate = change_rate
+        self.version = 1
+        self.sports: Dict[int, Dict[str, Any]] = {}
+        for sport_id in range(1, sports + 1):
+            self.sports[sport_id] = {
+                'name': SPORT_NAMES[(sport_id - 1) % len(SPORT_NAMES)],
+                'events': [make_event(self.rng, sport_id, sport_id * 10 ** 6 + i, lines) for i in range(events)]
+            }
+            for event in self.sports[sport_id]['events']:
+                event['last'] = self.version
+
+    def tick(self):
+        """Move prices on a change_rate share of every sport's events"""
+        self.version += 1
+        for sport in self.sports.values():
+            events = sport['events']
+            for event in self.rng.sample(events, round(len(events) * self.change_rate)):
+                period = event['periods'][self.rng.choice(['num_0', 'num_1'])]
+                market = self.rng.choice(['money_line', 'spreads', 'totals'])
+                if market == 'money_line':
+                    period['money_line']['home'] = random_price(self.rng)
+                else:
+                    line = self.rng.choice(list(period[market].values()))
+                    line['home' if market == 'spreads' else 'over'] = random_price(self.rng)
+                event['last'] = self.version
+
+    def sports_list(self) -> List[Dict[str, Any]]:
+        return [{'id': sport_id, 'name': sport['name']} for sport_id, sport in self.sports.items()]
+
+    def markets(self, sport_id: int, since: Optional[int]) -> Dict[str, Any]:
+        sport = self.sports.get(sport_id)
+        if sport is None:
+            return {'sport_id': sport_id, 'sport_name': None, 'last': self.version, 'events': []}
+        events = sport['events'] if since is None else [e for e in sport['events'] if e['last'] > since]
+        return {'sport_id': sport_id, 'sport_name': sport['name'], 'last': self.version, 'events': events}
+
+class ReplayMarkets:
+    """Recorded /markets responses, served in order for each sport"""
+    def __init__(self, path: str):
+        self.responses: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    response = json.loads(line)
+                    self.responses[int(response['sport_id'])].append(response)
+        self.served: Dict[int, int] = defaultdict(int)
+
+    def tick(self):
+        pass
+
+    def sports_list(self) -> List[Dict[str, Any]]:
+        return [{'id': sport_id, 'name': responses[0].get('sport_name')} for sport_id, responses in self.responses.items()]
+
+    def markets(self, sport_id: int, since: Optional[int]) -> Dict[str, Any]:
+        responses = self.responses.get(sport_id)
+        if not responses:
+            return {'sport_id': sport_id, 'sport_name': None, 'last': since, 'events': []}
+        index = self.served[sport_id]
+        if index >= len(responses):
+            # Recording exhausted; behave like a market with nothing new
+            last = responses[-1]
+            return {'sport_id': sport_id, 'sport_name': last.get('sport_name'), 'last': last.get('last'), 'events': []}
+        self.served[sport_id] += 1
+        return responses[index]
+
+def create_app(markets, tick_interval: float = 1.0) -> web.Application:
+    """Build the mock API; prices move every tick_interval seconds while it runs"""
+    async def sports_handler(request: web.Request) -> web.Response:
+        return web.json_response(markets.sports_list())
+
+    async def markets_handler(request: web.Request) -> web.Response:
+        try:
+            sport_id = int(request.query['sport_id'])
+        except (KeyError, ValueError):
+            return web.json_response({'error': 'sport_id is required'}, status=400)
+        since = request.query.get('since')
+        since = int(float(since)) if since else None
+        body = json.dumps(markets.markets(sport_id, since))
+        return web.Response(text=body, content_type='application/json')
+
+    async def ticker(app: web.Application):
+        async def run():
+            while True:
+                await asyncio.sleep(tick_interval)
+                markets.tick()
+        task = asyncio.create_task(run())
+        yield
+        task.cancel()
+
+    app = web.Application()
+    app['markets'] = markets
+    app.router.add_get('/sports', sports_handler)
+    app.router.add_get('/markets', markets_handler)
+    app.cleanup_ctx.append(ticker)
+    return app
+
+def build_markets(args: argparse.Namespace):
+    if args.replay:
+        return ReplayMarkets(args.replay)
+    return SyntheticMarkets(args.sports, args.events, args.lines, args.change_rate, args.seed)
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--sports', type=int, default=3, help='number of synthetic sports')
+    parser.add_argument('--events', type=int, default=1000, help='events per synthetic sport')
+    parser.add_argument('--lines', type=int, default=5, help='spread and total lines per period')
+    parser.add_argument('--change-rate', type=float, default=0.05, help='share of events changed per tick')
+    parser.add_argument('--tick', type=float, default=1.0, help='seconds between price moves')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--replay', help='JSON lines file of recorded /markets responses')
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Mock Pinnacle API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    logger.info(f"Serving mock Pinnacle API on http://{args.host}:{args.port}")
+    web.run_app(create_app(build_markets(args), args.tick), host=args.host, port=args.port, print=None)
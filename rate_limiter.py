@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+logger = logging.getLogger('odds_collector')
+
+# Longest pause after repeated 429 responses without a Retry-After header
+RATE_LIMIT_MAX_BACKOFF: float = float(os.getenv('RATE_LIMIT_MAX_BACKOFF', 60))
+
+class TokenBucket:
+    """
+    Async token bucket shared by every sport collector in the process.
+    Tokens refill at `rate` per second up to `burst`, so idle time can be spent
+    later as a short burst without ever exceeding the average rate.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.failures = 0
+        # asyncio.Lock wakes waiters in FIFO order, which keeps sports fair
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def set_rate(self, rate: float):
+        """Change the refill rate, e.g. when the budget is shared by a different number of nodes"""
+        self._refill(time.monotonic())
+        self.rate = rate
+
+    def backoff(self, retry_after: Optional[float] = None):
+        """Pause all requests after the API answered 429"""
+        self.failures += 1
+        if retry_after is None:
+            retry_after = min(RATE_LIMIT_MAX_BACKOFF, (1 / self.rate) * 2 ** self.failures)
+
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.tokens = 0
+        logger.warning(f"Rate limited by API, pausing requests for {retry_after:.2f}s")
+
+    def succeeded(self):
+        """Reset the exponential backoff once a request gets through"""
+        self.failures = 0
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Read a Retry-After header given in seconds"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
@@ -1,4 +1,5 @@
 from create_database import DatabaseManager
+from migrations import apply_migrations
 import logging
 
 # Set up logging
@@ -9,6 +10,8 @@ if __name__ == "__main__":
     try:
         db.ensure_database_exists()
         db.ensure_tables_exist()
+        db.ensure_chart_aggregates()
+        apply_migrations()
         db.verify_tables()
     except Exception as e:
         logging.error(f"Error: {e}")
\ No newline at end of file
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger('odds_collector')
+
+# Share of RATE_LIMIT handed out to scheduled polls; the rest absorbs retries
+SCHEDULER_BUDGET_SHARE: float = float(os.getenv('SCHEDULER_BUDGET_SHARE', 0.9))
+# Bounds on the time between two polls of the same sport, in seconds
+SCHEDULER_MIN_INTERVAL: float = float(os.getenv('SCHEDULER_MIN_INTERVAL', 0.5))
+SCHEDULER_MAX_INTERVAL: float = float(os.getenv('SCHEDULER_MAX_INTERVAL', 120))
+# Markets starting within this many minutes are polled faster the closer they get
+SCHEDULER_KICKOFF_HORIZON: float = float(os.getenv('SCHEDULER_KICKOFF_HORIZON', 60)) * 60
+# How much more budget a sport with an imminent or running event receives
+SCHEDULER_KICKOFF_BOOST: float = float(os.getenv('SCHEDULER_KICKOFF_BOOST', 4))
+# Smoothing of the change rate, the weight of the most recent poll
+SCHEDULER_SMOOTHING: float = float(os.getenv('SCHEDULER_SMOOTHING', 0.3))
+# Floor on a sport's change rate so quiet sports are still polled now and then
+SCHEDULER_IDLE_RATE: float = 0.05
+# Sleeping sports re-check their deadline this often, in case the budget shifted
+SCHEDULER_RECHECK: float = 5
+
+class SportSchedule:
+    """Polling statistics of one sport"""
+    __slots__ = ('sport_id', 'change_rate', 'events', 'next_start', 'live', 'last_poll', 'last_observed')
+
+    def __init__(self, sport_id: int):
+        self.sport_id = sport_id
+        # Smoothed number of changed events per second
+        self.change_rate = 0.0
+        # event_id -> (starts, last cutoff), naive UTC
+        self.events: Dict[int, Tuple[Optional[datetime], Optional[datetime]]] = {}
+        self.next_start: Optional[datetime] = None
+        self.live = False
+        self.last_poll: Optional[float] = None
+        self.last_observed: Optional[float] = None
+
+    def urgency(self, now: datetime) -> float:
+        """0 for nothing on the horizon, rising to 1 at kickoff and while an event is running"""
+        if self.live:
+            return 1.0
+        if self.next_start is None:
+            return 0.0
+        seconds = (self.next_start - now).total_seconds()
+        return max(0.0, min(1.0, 1 - seconds / SCHEDULER_KICKOFF_HORIZON))
+
+    def weight(self, now: datetime) -> float:
+        """Relative share of the request budget this sport deserves"""
+        return (
+            max(SCHEDULER_IDLE_RATE, self.change_rate)
+            * math.log2(2 + len(self.events))
+            * (1 + SCHEDULER_KICKOFF_BOOST * self.urgency(now))
+        )
+
+class PollScheduler:
+    """
+    Spreads the global request budget over the sports. Each sport gets a share
+    of RATE_LIMIT proportional to its weight, which grows with its recent change
+    rate, its number of open events and the nearness of its next kickoff, so
+    the sum of all poll rates stays within the budget.
+    """
+    def __init__(self, rate: float):
+        self.budget = rate * SCHEDULER_BUDGET_SHARE
+        self.sports: Dict[int, SportSchedule] = {}
+
+    def set_rate(self, rate: float):
+        self.budget = rate * SCHEDULER_BUDGET_SHARE
+
+    def sport(self, sport_id: int) -> SportSchedule:
+        schedule = self.sports.get(sport_id)
+        if schedule is None:
+            schedule = self.sports[sport_id] = SportSchedule(sport_id)
+        return schedule
+
+    def remove(self, sport_id: int):
+        self.sports.pop(sport_id, None)
+
+    def track_event(self, sport_id: int, event_id: int, starts: Optional[datetime], cutoffs: Iterable[Optional[datetime]]):
+        """Remember when an event starts and when its last market closes"""
+        cutoffs = [cutoff for cutoff in cutoffs if cutoff is not None]
+        self.sport(sport_id).events[event_id] = (starts, max(cutoffs) if cutoffs else starts)
+
+    def observe(self, sport_id: int, changed: int, first_pass: bool = False):
+        """Fold one finished poll into the sport's statistics"""
+        schedule = self.sport(sport_id)
+        observed = time.monotonic()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        # The first poll returns the whole snapshot, which says nothing about the change rate
+        if not first_pass and schedule.last_observed is not None:
+            elapsed = max(observed - schedule.last_observed, SCHEDULER_MIN_INTERVAL)
+            schedule.change_rate += SCHEDULER_SMOOTHING * (changed / elapsed - schedule.change_rate)
+        schedule.last_observed = observed
+
+        # Drop finished events and find the next kickoff among the rest
+        next_start = None
+        live = False
+        for event_id, (starts, ends) in list(schedule.events.items()):
+            if ends is not None and ends < now:
+                del schedule.events[event_id]
+            elif starts is not None and starts <= now:
+                live = True
+            elif starts is not None and (next_start is None or starts < next_start):
+                next_start = starts
+        schedule.next_start = next_start
+        schedule.live = live
+
+    def interval(self, sport_id: int) -> float:
+        """Seconds between two polls of a sport under the current budget split"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        weights = {sid: schedule.weight(now) for sid, schedule in self.sports.items()}
+        total = sum(weights.values())
+        share = self.budget * weights.get(sport_id, 0) / total if total else self.budget
+        if share <= 0:
+            return SCHEDULER_MAX_INTERVAL
+        return max(SCHEDULER_MIN_INTERVAL, min(SCHEDULER_MAX_INTERVAL, 1 / share))
+
+    async def wait(self, sport_id: int):
+        """Sleep until the sport is due, then mark the start of its poll"""
+        schedule = self.sport(sport_id)
+        while schedule.last_poll is not None:
+            remaining = schedule.last_poll + self.interval(sport_id) - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, SCHEDULER_RECHECK))
+        schedule.last_poll = time.monotonic()
+
+    def stats(self) -> Dict[int, Dict[str, float]]:
+        return {
+            sport_id: {
+                'interval': round(self.interval(sport_id), 2),
+                'change_rate': round(schedule.change_rate, 3),
+                'events': len(schedule.events)
+            }
+            for sport_id, schedule in self.sports.items()
+        }
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger('odds_collector')
+
+# Append-only file holding batches that could not be written while the database was down
+SPOOL_PATH: str = os.getenv('SPOOL_PATH', 'spool/odds_spool.jsonl')
+# fsync every record so a crash right after spooling loses nothing
+SPOOL_FSYNC: bool = os.getenv('SPOOL_FSYNC', '1') == '1'
+# Pause between replay attempts while the database is still unreachable
+SPOOL_RETRY_INTERVAL: float = float(os.getenv('SPOOL_RETRY_INTERVAL', 5))
+
+class Spool:
+    """
+    Local JSON-lines spool of write batches. Records are appended in the order
+    the batches were produced and replayed in that order; each carries a
+    record_id the database remembers, so a record replayed twice (e.g. after a
+    crash between commit and truncation) is written once. A torn last line
+    from a crash mid-append is ignored.
+
+    While any record is pending, new batches are appended behind it instead of
+    being written directly, which keeps every sport's writes in order.
+    """
+    def __init__(self, path: str = SPOOL_PATH):
+        self.path = path
+        # Byte offset up to which records were replayed
+        self.offset = 0
+        self.pending = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'ab')
+        end = 0
+        for end, _ in self.records():
+            self.pending += 1
+        # Cut a torn tail off, or the next append would be glued onto it
+        if os.path.getsize(path) > end:
+            self.file.truncate(end)
+        if self.pending:
+            logger.warning(f"Found {self.pending} spooled batches from a previous run, replaying them")
+
+    @property
+    def active(self) -> bool:
+        return self.pending > 0
+
+    def append(self, record: Dict[str, Any]) -> str:
+        """Durably append one record and return its id"""
+        record_id = record.setdefault('record_id', uuid.uuid4().hex)
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        self.file.write(line)
+        self.file.flush()
+        if SPOOL_FSYNC:
+            os.fsync(self.file.fileno())
+        self.pending += 1
+        return record_id
+
+    def records(self, offset: int = 0):
+        """Yield (end offset, record) for each complete record after offset"""
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    logger.warning(f"Ignoring torn record at the end of {self.path}")
+                    return
+                offset += len(line)
+                try:
+                    yield offset, json.loads(line)
+                except ValueError:
+                    logger.error(f"Skipping unreadable spool record ending at byte {offset}")
+
+    def next_record(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        for item in self.records(self.offset):
+            return item
+        return None
+
+    def done(self, offset: int):
+        """Mark records up to offset as written; empties the file once all are"""
+        self.offset = offset
+        self.pending = max(0, self.pending - 1)
+        if self.next_record() is None:
+            self.file.truncate(0)
+            self.offset = 0
+            self.pending = 0
+
+    def close(self):
+        self.file.close()
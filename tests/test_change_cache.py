@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+from change_cache import ChangeCache, parse_api_time
+
+def test_lines_with_colliding_hashes_keep_separate_slots():
+    # hash(-1.0) == hash(-2.0) in CPython
+    cache = ChangeCache()
+    minus_one = ('spreads', 'num_0', -1.0)
+    minus_two = ('spreads', 'num_0', -2.0)
+
+    assert cache.has_changed(1, minus_one, (1.9, 1.95, 500))
+    assert cache.has_changed(1, minus_two, (2.3, 1.6, 500))
+    assert cache.size == 2
+
+    for _ in range(2):
+        assert not cache.has_changed(1, minus_one, (1.9, 1.95, 500))
+        assert not cache.has_changed(1, minus_two, (2.3, 1.6, 500))
+
+def test_values_with_colliding_hashes_count_as_changed():
+    cache = ChangeCache()
+    key = ('board', 'spreads', 'num_0')
+    assert cache.has_changed(1, key, (-1.0, 0.5))
+    assert cache.has_changed(1, key, (-2.0, 0.5))
+
+def test_seeded_line_is_unchanged():
+    cache = ChangeCache()
+    cache.seed(1, ('spreads', 'num_0', -1.0), (1.9, 1.95, 500.0))
+    assert not cache.has_changed(1, ('spreads', 'num_0', -1.0), (1.9, 1.95, 500.0))
+    assert cache.has_changed(1, ('spreads', 'num_0', -2.0), (1.9, 1.95, 500.0))
+
+def test_size_cap_evicts_least_recently_seen_events():
+    cache = ChangeCache(max_entries=4)
+    for event_id in (1, 2, 3):
+        cache.touch(event_id, None)
+        cache.has_changed(event_id, ('money_lines', 'num_0'), (1.9, 3.3, 4.0, 50))
+    # Event 1 was seen again, so event 2 is now the oldest
+    cache.touch(1, None)
+    cache.has_changed(3, ('spreads', 'num_0', 0.5), (1.9, 1.9, 100))
+    cache.has_changed(3, ('spreads', 'num_0', 1.0), (1.9, 1.9, 100))
+
+    assert list(cache.events) == [3, 1]
+    assert cache.size == 4
+    assert cache.evictions == 1
+
+def test_prune_drops_events_past_their_expiry():
+    cache = ChangeCache(evict_after=timedelta(minutes=10))
+    now = datetime(2026, 10, 18, 12, 0)
+    cache.touch(1, now - timedelta(minutes=30))
+    cache.touch(2, now - timedelta(minutes=5))
+    cache.touch(3, None)
+    for event_id in (1, 2, 3):
+        cache.has_changed(event_id, ('events',), (event_id,))
+    cache.last_prune = float('-inf')
+
+    assert cache.prune(now) == 1
+    assert set(cache.events) == {2, 3}
+    assert cache.size == 2
+    # Sweeps run at most once per interval
+    assert cache.prune(now + timedelta(days=1)) == 0
+
+def test_forget_makes_the_next_poll_write_again():
+    cache = ChangeCache()
+    key = ('totals', 'num_0', 2.5)
+    cache.has_changed(1, key, (1.8, 2.1, 100))
+    cache.forget(1, key)
+    assert cache.size == 0
+    assert cache.has_changed(1, key, (1.8, 2.1, 100))
+    # Forgetting an unknown key or event is a no-op
+    cache.forget(1, ('totals', 'num_0', 3.5))
+    cache.forget(2, key)
+    assert cache.size == 1
+
+def test_period_id_is_reused_only_while_metadata_holds():
+    cache = ChangeCache()
+    meta = (1, '2026-10-19T12:00:00', 100, 50, 100, 20, 1, 0)
+    assert cache.period_id(1, 0, meta) is None
+    cache.touch(1, None)
+    cache.remember_period(1, 0, meta, 42)
+    assert cache.period_id(1, 0, meta) == 42
+    assert cache.period_id(1, 0, meta[:2] + (200,) + meta[3:]) is None
+
+def test_seed_does_not_count_as_a_lookup():
+    cache = ChangeCache()
+    cache.seed(1, ('events',), (1,))
+    cache.seed(1, ('events',), (2,))
+    assert cache.stats() == {'events': 1, 'size': 1, 'hits': 0, 'misses': 0, 'evictions': 0}
+
+def test_parse_api_time_returns_naive_utc():
+    assert parse_api_time('2026-10-19T12:00:00Z') == datetime(2026, 10, 19, 12, 0)
+    assert parse_api_time('2026-10-19T14:00:00+02:00') == datetime(2026, 10, 19, 12, 0)
+    assert parse_api_time('2026-10-19T12:00:00') == datetime(2026, 10, 19, 12, 0)
+    assert parse_api_time('soon') is None
+    assert parse_api_time(None) is None
@@ -0,0 +1,59 @@
+import migrations
+from migrations import online_index, split_statements, load_migrations, NO_TRANSACTION_FLAG
+
+def test_split_statements_skips_comments_and_keeps_multiline_statements():
+    sql = """-- migrate: no-transaction
+-- a comment
+
+CREATE INDEX IF NOT EXISTS idx_a ON a (x)
+    WITH (timescaledb.transaction_per_chunk);
+DROP INDEX IF EXISTS idx_b;
+"""
+    assert split_statements(sql) == [
+        "CREATE INDEX IF NOT EXISTS idx_a ON a (x)\n    WITH (timescaledb.transaction_per_chunk);",
+        "DROP INDEX IF EXISTS idx_b;"
+    ]
+
+def test_split_statements_keeps_an_unterminated_tail():
+    assert split_statements("SELECT 1;\nSELECT 2") == ["SELECT 1;", "SELECT 2"]
+
+def test_online_index_detects_concurrent_and_per_chunk_builds():
+    assert online_index("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_e ON events (x);") == ('idx_e', True)
+    assert online_index(
+        "CREATE INDEX IF NOT EXISTS idx_h ON spreads (x) WITH (timescaledb.transaction_per_chunk);"
+    ) == ('idx_h', False)
+    assert online_index("CREATE INDEX IF NOT EXISTS idx_p ON periods (x);") == ('', False)
+    assert online_index("DROP INDEX CONCURRENTLY IF EXISTS idx_e;") == ('', False)
+
+class RecordingCursor:
+    def __init__(self, invalid):
+        self.invalid = invalid
+        self.statements = []
+        self.result = None
+
+    def execute(self, sql, params=None):
+        self.statements.append(' '.join(sql.split()))
+        self.result = (1,) if params and params[0] in self.invalid else None
+
+    def fetchone(self):
+        return self.result
+
+def test_invalid_hypertable_index_is_dropped_without_concurrently():
+    cur = RecordingCursor(invalid={'idx_h'})
+    migrations.drop_invalid_index(cur, "CREATE INDEX IF NOT EXISTS idx_h ON spreads (x) WITH (timescaledb.transaction_per_chunk);")
+    assert cur.statements[-1] == "DROP INDEX IF EXISTS idx_h;"
+
+    cur = RecordingCursor(invalid={'idx_e'})
+    migrations.drop_invalid_index(cur, "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_e ON events (x);")
+    assert cur.statements[-1] == "DROP INDEX CONCURRENTLY IF EXISTS idx_e;"
+
+def test_shipped_migrations_are_ordered_and_online_builds_are_detectable():
+    loaded = load_migrations()
+    versions = [version for version, _, _ in loaded]
+    assert versions == sorted(versions) and len(set(versions)) == len(versions)
+    for _, _, sql in loaded:
+        if not sql.lstrip().startswith(NO_TRANSACTION_FLAG):
+            continue
+        for statement in split_statements(sql):
+            if statement.upper().startswith('CREATE INDEX'):
+                assert online_index(statement)[0]
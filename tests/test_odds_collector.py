@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import ijson
+import pytest
+
+from api_scraper import MarketsStream, OddsBatch, OddsCollector
+from change_cache import ChangeCache
+from scheduler import PollScheduler
+
+EVENT = {
+    'event_id': 1600000001, 'sport_id': 29, 'league_id': 1980, 'league_name': 'England - Premier League',
+    'starts': '2026-10-24T14:00:00', 'home': 'Arsenal', 'away': 'Chelsea', 'event_type': 'prematch',
+    'parent_id': None, 'resulting_unit': 'Regular', 'is_have_odds': True,
+    'periods': {
+        'num_0': {
+            'line_id': 3000000001, 'number': 0, 'period_status': 1, 'cutoff': '2026-10-24T14:00:00',
+            'meta': {'max_spread': 5000, 'max_money_line': 2500, 'max_total': 5000, 'max_team_total': 1000},
+            'money_line': {'home': 2.1, 'draw': 3.4, 'away': 4},
+            'spreads': {'-1.0': {'hdp': -1, 'alt_line_id': None, 'home': 2, 'away': 1.85, 'max': 5000}},
+            'totals': {'2.5': {'points': 2.5, 'alt_line_id': None, 'over': 1.9, 'under': 2, 'max': 5000}},
+            'team_total': {'home': {'points': 1.5, 'over': 2, 'under': 1.8}},
+        }
+    },
+}
+
+def decoded_event():
+    """EVENT as the collector sees it, with JSON integer literals left as int"""
+    stream = MarketsStream()
+    body = json.dumps({'sport_id': 29, 'sport_name': 'Soccer', 'last': 1, 'events': [EVENT]}).encode()
+    return (stream.feed(body) + stream.close())[0]
+
+def test_warm_started_lines_are_not_written_again():
+    collector = OddsCollector(None, None, ChangeCache(), PollScheduler(1.0))
+    expires_at = datetime(2026, 10, 24, 14, 0)
+    # Latest stored rows as load_latest_lines returns them, every number a DECIMAL
+    collector.db_manager.warm_cache([
+        ('money_lines', 1600000001, 0, None, None,
+         Decimal('2.1'), Decimal('3.4'), Decimal('4'), Decimal('2500'), expires_at),
+        ('spreads', 1600000001, 0, Decimal('-1.0'), None,
+         Decimal('2'), Decimal('1.85'), Decimal('5000'), None, expires_at),
+        ('totals', 1600000001, 0, Decimal('2.5'), None,
+         Decimal('1.9'), Decimal('2'), Decimal('5000'), None, expires_at),
+        ('team_totals', 1600000001, 0, None, 'home',
+         Decimal('1.5'), Decimal('2'), Decimal('1.8'), Decimal('1000'), expires_at),
+    ])
+
+    batch = OddsBatch(29)
+    collector.store_event(batch, decoded_event(), 'Soccer')
+
+    assert batch.money_lines == []
+    assert batch.spreads == []
+    assert batch.totals == []
+    assert batch.team_totals == []
+
+def test_markets_stream_decodes_events_across_chunk_boundaries():
+    second = dict(EVENT, event_id=1600000002, home='Everton', away='Fulham')
+    body = json.dumps({'sport_id': 29, 'events': [EVENT, second], 'sport_name': 'Soccer', 'last': 1760000000}).encode()
+    stream = MarketsStream()
+    events = []
+    for i in range(0, len(body), 7):
+        events.extend(stream.feed(body[i:i + 7]))
+    events.extend(stream.close())
+
+    assert events == json.loads(body)['events']
+    # Fields after the events array are picked out of the same pass
+    assert stream.field('sport_name') == 'Soccer'
+    assert stream.field('last') == 1760000000
+    assert stream.field('missing') is None
+
+def test_markets_stream_hands_out_each_event_once_it_is_complete():
+    body = json.dumps({'events': [EVENT, EVENT]}).encode()
+    first_end = body.index(b'}, {') + 1
+    stream = MarketsStream()
+    assert stream.feed(body[:first_end - 1]) == []
+    assert len(stream.feed(body[first_end - 1:first_end + 2])) == 1
+    assert len(stream.feed(body[first_end + 2:]) + stream.close()) == 1
+
+def test_markets_stream_raises_on_a_truncated_body():
+    body = json.dumps({'sport_name': 'Soccer', 'events': [EVENT]}).encode()
+    stream = MarketsStream()
+    stream.feed(body[:-10])
+    with pytest.raises(ijson.IncompleteJSONError):
+        stream.close()
+
+def test_spool_record_round_trip_keeps_everything_write_batch_needs():
+    collector = OddsCollector(None, None, ChangeCache(), PollScheduler(1.0))
+    batch = OddsBatch(29)
+    collector.store_event(batch, decoded_event(), 'Soccer')
+    batch.period_ids[(1600000002, 0)] = 42
+    batch.final = True
+    batch.event_count = 2
+    batch.since = 1759990000
+    batch.cursor = 1760000000
+    batch.recorded_at = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+    assert batch.money_lines and batch.spreads and batch.totals and batch.team_totals and batch.open_lines
+
+    # The spool stores the record as a JSON line and adds its record_id
+    record = json.loads(json.dumps(batch.to_record()))
+    record['record_id'] = 'abc'
+    replayed = OddsBatch.from_record(record)
+
+    assert replayed.record_id == 'abc'
+    for name in ('sport_id', 'since', 'final', 'event_count', 'cursor', 'recorded_at', 'events', 'seen',
+                 'periods', 'period_ids', 'money_lines', 'spreads', 'totals', 'team_totals', 'open_lines'):
+        assert getattr(replayed, name) == getattr(batch, name), name
+    assert replayed.row_count() == batch.row_count()
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+import rate_limiter
+from rate_limiter import TokenBucket, parse_retry_after
+
+class FakeClock:
+    """Stands in for time and asyncio in rate_limiter; sleeping advances the clock"""
+    Lock = asyncio.Lock
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    monkeypatch.setattr(rate_limiter, 'asyncio', clock)
+    return clock
+
+def acquire(bucket, times):
+    async def run():
+        for _ in range(times):
+            await bucket.acquire()
+    asyncio.run(run())
+
+def test_burst_is_spent_without_waiting_then_requests_are_paced(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    acquire(bucket, 3)
+    assert clock.now == 1000.0
+
+    acquire(bucket, 2)
+    assert clock.now == pytest.approx(1001.0)
+
+def test_idle_time_refills_up_to_the_burst_only(clock):
+    bucket = TokenBucket(rate=1, burst=2)
+    acquire(bucket, 2)
+    clock.now += 60
+    acquire(bucket, 3)
+    assert clock.now == pytest.approx(1061.0)
+
+def test_backoff_pauses_requests_and_grows_until_a_success(clock):
+    bucket = TokenBucket(rate=1, burst=5)
+    bucket.backoff()
+    assert bucket.blocked_until == pytest.approx(1002.0)
+    bucket.backoff()
+    assert bucket.blocked_until == pytest.approx(1004.0)
+
+    acquire(bucket, 1)
+    assert clock.now >= 1004.0
+    bucket.succeeded()
+    assert bucket.failures == 0
+
+def test_backoff_follows_retry_after_and_is_capped(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMIT_MAX_BACKOFF', 10)
+    bucket = TokenBucket(rate=0.01)
+    bucket.backoff()
+    assert bucket.blocked_until == pytest.approx(1010.0)
+    bucket.backoff(retry_after=30)
+    assert bucket.blocked_until == pytest.approx(1030.0)
+
+def test_set_rate_keeps_tokens_earned_at_the_old_rate(clock):
+    bucket = TokenBucket(rate=1, burst=10)
+    acquire(bucket, 10)
+    clock.now += 2
+    bucket.set_rate(100)
+    assert bucket.tokens == pytest.approx(2)
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after('Wed, 21 Oct 2026 07:28:00 GMT') is None
+    assert parse_retry_after(None) is None
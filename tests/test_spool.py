@@ -0,0 +1,68 @@
+import os
+
+from spool import Spool
+
+def test_records_are_replayed_in_order_and_the_file_is_emptied(tmp_path):
+    path = str(tmp_path / 'spool' / 'odds.jsonl')
+    spool = Spool(path)
+    assert not spool.active
+    first = spool.append({'sport_id': 1})
+    spool.append({'sport_id': 2})
+    assert spool.active and spool.pending == 2
+
+    offset, record = spool.next_record()
+    assert record == {'sport_id': 1, 'record_id': first}
+    spool.done(offset)
+    assert spool.pending == 1
+
+    offset, record = spool.next_record()
+    assert record['sport_id'] == 2
+    spool.done(offset)
+    assert not spool.active
+    assert spool.next_record() is None
+    assert os.path.getsize(path) == 0
+    spool.close()
+
+def test_record_id_is_kept_when_given(tmp_path):
+    spool = Spool(str(tmp_path / 'odds.jsonl'))
+    assert spool.append({'record_id': 'abc'}) == 'abc'
+    spool.close()
+
+def test_pending_records_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'odds.jsonl')
+    spool = Spool(path)
+    spool.append({'sport_id': 1})
+    spool.append({'sport_id': 2})
+    spool.close()
+
+    spool = Spool(path)
+    assert spool.pending == 2
+    assert [record['sport_id'] for _, record in spool.records()] == [1, 2]
+    spool.close()
+
+def test_a_torn_tail_is_cut_off_before_the_next_append(tmp_path):
+    path = str(tmp_path / 'odds.jsonl')
+    spool = Spool(path)
+    spool.append({'sport_id': 1})
+    spool.close()
+    with open(path, 'ab') as f:
+        f.write(b'{"sport_id": 2, "ev')
+
+    spool = Spool(path)
+    assert spool.pending == 1
+    spool.append({'sport_id': 3})
+    assert [record['sport_id'] for _, record in spool.records()] == [1, 3]
+    spool.close()
+
+def test_an_unreadable_line_is_skipped(tmp_path):
+    path = str(tmp_path / 'odds.jsonl')
+    with open(path, 'wb') as f:
+        f.write(b'not json\n{"sport_id": 1}\n')
+
+    spool = Spool(path)
+    assert spool.pending == 1
+    offset, record = spool.next_record()
+    assert record == {'sport_id': 1}
+    spool.done(offset)
+    assert not spool.active
+    spool.close()